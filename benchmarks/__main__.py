@@ -0,0 +1,299 @@
+import os
+import re
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+# benchmark harness for the scrapers and the consolidador
+#
+# for every case and size it generates synthetic inputs (see synthetic.py), runs the
+# entry point in its own process and records wall time, peak RSS and the time of
+# each phase, then writes everything to a json file that can be compared with the
+# results of another version:
+#
+#   python benchmarks --sizes 100 1000 --output results.json
+#   python benchmarks --sizes 100 1000 --output new.json --compare results.json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIQUIDACIONES_DIR = os.path.join(ROOT_DIR, "liquidaciones")
+CONSOLIDADOR_DIR = os.path.join(ROOT_DIR, "consolidador")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CASES = ["scraper", "scraper-streaming", "scraper-snapshot", "patentes", "consolidador", "statement-adapters"]
+
+PHASE_LINE = re.compile(r"---- (.+?) / ([0-9.e-]+) seconds ----")
+
+
+# ------------------------------------------
+#             CHILD PROCESS
+# ------------------------------------------
+
+def _timed(module, name, phases, phase):
+    # replaces module.name with a wrapper that adds its run time to phases[phase]
+    function = getattr(module, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+    setattr(module, name, wrapper)
+
+
+def run_adapters(directory):
+    """
+    reads and normalizes the statements of the month with each adapter on its own,
+    one "read <name>" and "normalize <name>" phase per adapter
+    """
+    sys.path.insert(0, CONSOLIDADOR_DIR)
+    from statements import STATEMENT_ADAPTERS
+
+    os.chdir(directory)
+    phases = {}
+
+    for name, adapter in STATEMENT_ADAPTERS.items():
+        start = time.perf_counter()
+        df = adapter.read(adapter.file("01", "24"), use_cache=False)
+        phases[f"read {name}"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        adapter.normalize(df)
+        phases[f"normalize {name}"] = time.perf_counter() - start
+
+    return phases
+
+
+def run_child(case, input_path, output_path):
+    """
+    runs one scraper case in this process and prints its phases as json
+    the export function is wrapped to time it, the rest of the run is the extraction
+    """
+    if case == "statement-adapters":
+        print("BENCH_PHASES " + json.dumps(run_adapters(input_path)))
+        return
+
+    sys.path.insert(0, LIQUIDACIONES_DIR)
+    phases = {}
+
+    start = time.perf_counter()
+
+    if case in ("scraper", "scraper-streaming", "scraper-snapshot"):
+        import scraper
+        _timed(scraper, "exportar_excel", phases, "export")
+        scraper.procesar_excel_y_exportar_excel(input_path, output_path, streaming=case == "scraper-streaming")
+
+    elif case == "patentes":
+        import motor_patentes
+        _timed(motor_patentes, "exportar_libro", phases, "export")
+        motor_patentes.procesar_libros([input_path], output_path)
+
+    else:
+        raise ValueError(f"unknown child case {case}")
+
+    total = time.perf_counter() - start
+    phases["extract"] = total - phases.get("export", 0.0)
+
+    print("BENCH_PHASES " + json.dumps(phases))
+
+
+# ------------------------------------------
+#             PARENT PROCESS
+# ------------------------------------------
+
+def run_measured(command, cwd=None, stdin_data=None):
+    """
+    runs a command and returns (output, wall seconds, peak rss in KB or None)
+    """
+    start = time.perf_counter()
+
+    process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+
+    if stdin_data:
+        process.stdin.write(stdin_data)
+    process.stdin.close()
+
+    output = process.stdout.read()
+    peak_rss = None
+
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        # linux reports KB, macOS bytes
+        peak_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    else:
+        process.wait()
+
+    wall = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with code {process.returncode}:\n{output}")
+
+    return output, wall, peak_rss
+
+
+def input_path(case, size, data_dir):
+    if case in ("scraper", "scraper-streaming"):
+        return os.path.join(data_dir, f"comprobantes-{size}.xlsx")
+
+    if case == "scraper-snapshot":
+        return os.path.join(data_dir, f"comprobantes-{size}.xlsx.ventanas.gz")
+
+    if case == "patentes":
+        return os.path.join(data_dir, f"patentes-{size}.xlsx")
+
+    return os.path.join(data_dir, f"consolidador-{size}")
+
+
+def generate_inputs(case, size, path):
+    import synthetic
+
+    if case in ("scraper", "scraper-streaming"):
+        synthetic.generate_receipt_workbook(path, size)
+    elif case == "scraper-snapshot":
+        # the snapshot of the same workbook the scraper cases use
+        workbook = input_path("scraper", size, os.path.dirname(path))
+        if not os.path.exists(workbook):
+            synthetic.generate_receipt_workbook(workbook, size)
+
+        sys.path.insert(0, LIQUIDACIONES_DIR)
+        import scraper
+        import instantaneas
+        instantaneas.guardar_instantanea(path, scraper.iterar_hojas(workbook, streaming=True))
+    elif case == "patentes":
+        synthetic.generate_patente_workbook(path, size)
+    else:
+        synthetic.generate_statements(path, size, month=1, year=2024)
+
+
+def prepare_inputs(case, size, data_dir):
+    path = input_path(case, size, data_dir)
+
+    # generated in another process: on linux a child inherits the peak rss of the
+    # parent at fork time, so the parent must not load pandas or openpyxl
+    if not os.path.exists(path):
+        run_measured([sys.executable, os.path.abspath(__file__), "--generate", case, str(size), path])
+
+    return path
+
+
+def run_case(case, size, data_dir):
+    generation_start = time.perf_counter()
+    inputs = prepare_inputs(case, size, data_dir)
+    generation = time.perf_counter() - generation_start
+
+    if case == "consolidador":
+        # without the input cache (datos/.cache), a run with --data-dir would otherwise read
+        # the files cached by the previous run and the comparison would not be fair
+        output, wall, peak_rss = run_measured(
+            [sys.executable, CONSOLIDADOR_DIR, "--no-cache"], cwd=inputs, stdin_data="1\n2024\n")
+        phases = {name: float(seconds) for name, seconds in PHASE_LINE.findall(output)}
+    else:
+        output_path = os.path.join(data_dir, f"salida-{case}-{size}.xlsx")
+        output, wall, peak_rss = run_measured(
+            [sys.executable, os.path.abspath(__file__), "--child", case, inputs, output_path])
+        phases = json.loads(output.split("BENCH_PHASES ", 1)[1].splitlines()[0])
+
+    return {
+        "case": case,
+        "size": size,
+        "wall_seconds": wall,
+        "peak_rss_kb": peak_rss,
+        "phases": phases,
+        "generation_seconds": generation,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    with open(previous_path) as previous_file:
+        previous = {(r["case"], r["size"]): r for r in json.load(previous_file)["results"]}
+
+    print(f"\ncompared with {previous_path}")
+
+    for result in results:
+        before = previous.get((result["case"], result["size"]))
+        if not before:
+            continue
+
+        ratio = result["wall_seconds"] / before["wall_seconds"] if before["wall_seconds"] else float("nan")
+        print(f"  {result['case']:<20} {result['size']:>7}  {before['wall_seconds']:8.2f}s -> {result['wall_seconds']:8.2f}s  (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks for the scrapers and the consolidador")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000],
+                        help="sheets per workbook / rows per statement (e.g. 100 1000 10000 50000)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--data-dir", help="keep the generated inputs here and reuse them on later runs")
+    parser.add_argument("--compare", metavar="RESULTS_JSON", help="print the wall time ratio against a previous results file")
+    parser.add_argument("--child", nargs=3, metavar=("CASE", "INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    parser.add_argument("--generate", nargs=3, metavar=("CASE", "SIZE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    if args.generate:
+        case, size, path = args.generate
+        generate_inputs(case, int(size), path)
+        return
+
+    temporary_dir = None
+    data_dir = args.data_dir
+
+    if not data_dir:
+        temporary_dir = tempfile.TemporaryDirectory()
+        data_dir = temporary_dir.name
+
+    os.makedirs(data_dir, exist_ok=True)
+
+    results = []
+
+    try:
+        for case in args.cases:
+            for size in args.sizes:
+                result = run_case(case, size, data_dir)
+                results.append(result)
+
+                rss = f"{result['peak_rss_kb'] / 1024:.0f} MB" if result["peak_rss_kb"] else "n/a"
+                print(f"---- {case} {size} / {result['wall_seconds']} seconds / {rss} ----")
+    finally:
+        if temporary_dir:
+            temporary_dir.cleanup()
+
+    with open(args.output, "w") as output_file:
+        json.dump({
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, output_file, indent=2)
+
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
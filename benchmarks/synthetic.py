@@ -0,0 +1,249 @@
+import os
+import random
+from datetime import date, datetime, timedelta
+
+import openpyxl
+import pandas as pd
+
+# synthetic input files with the same layout as the real ones, so the benchmarks
+# can run offline and without taxpayer data
+#
+# every generator is deterministic for a given size (fixed random seed)
+
+FIRST_RECEIPT_NUMBER = 10000
+
+RECEIPT_DESCRIPTIONS = [
+    ("PAGO POR MANTENIMIENTO DE PATENTE DE INDUSTRIA Y COMERCIO CORRESPONDIENTE AL AÑO 2024",
+     "3.01.02.07.00 - PATENTE DE INDUSTRIA Y COMERCIO"),
+    ("PAGO POR INSCRIPCION DE PATENTE DE INDUSTRIA Y COMERCIO",
+     "3.01.02.07.00 - PATENTE DE INDUSTRIA Y COMERCIO"),
+    ("PAGO DE IMPUESTO SOBRE LA PROPIEDAD INMOBILIARIA DEL INMUEBLE UBICADO EN LA CALLE {n} ASIGNADA CON EL CODIGO CATASTRAL Nº 11-05-{n:04d}. AÑO 2024",
+     "3.01.02.01.00 - IMPUESTO SOBRE INMUEBLES URBANOS"),
+    ("PAGO POR ARRENDAMIENTO DE TERRENO UBICADA EN EL SECTOR {n} ASIGNADA CON EL CODIGO CATASTRAL Nº 11-07-{n:04d}. AÑO 2024",
+     "3.01.09.01.00 - ARRENDAMIENTO DE TERRENOS"),
+    ("PAGO DE TASA ADMINISTRATIVA",
+     "3.01.03.40.00 - TASAS ADMINISTRATIVAS"),
+]
+
+MONTHS = ["ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO", "JULIO",
+          "AGOSTO", "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE"]
+
+
+def _ve_amount(amount):
+    # 1234.5 => "1.234,50"
+    return f"{amount:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _receipt_rows(rng, number, issued):
+    description, item = rng.choice(RECEIPT_DESCRIPTIONS)
+    description = description.format(n=number % 1000)
+
+    exonerated = rng.random() < 0.05
+    amount = round(rng.uniform(10, 5000), 2)
+    items = rng.randint(1, 3)
+
+    rows = {
+        8: {2: f"COMPROBANTE DE INGRESO N°{number}"},
+        10: {2: f"PUERTO CUMAREBO, {issued.day:02d} DE {MONTHS[issued.month - 1]} {issued.year}"},
+        12: {1: "RAZON SOCIAL:", 3: f"CONTRIBUYENTE {number}", 7: "RIF:", 8: f"V-{rng.randint(1000000, 30000000)}"},
+        13: {1: "REPRESENTANTE LEGAL", 7: "C.I. NRO", 8: ""},
+        14: {1: "DESCRIPCION DEL PAGO", 3: description},
+        15: {1: "TRANSFERENCIA"},
+        17: {1: "MONTO:", 2: "EXONERADO" if exonerated else amount, 3: "MONTO EN LETRAS"},
+        20: {1: "CÓDIGO", 2: "DESCRIPCIÓN", 8: "MONTO"},
+        29: {7: "TOTAL COMPROBANTE DE INGRESO:", 8: amount},
+    }
+
+    for i in range(items):
+        rows[21 + i] = {1: item, 8: round(amount / items, 2)}
+
+    payment_row = rng.randint(32, 35)
+    rows[payment_row] = {1: "DATOS DEL PAGO", 6: "FIRMA Y SELLO"}
+    rows[payment_row + 1] = {1: "BANCO:", 3: rng.choice(["BANCO DE VENEZUELA", "BANCO DIGITAL DE LOS TRABAJADORES"])}
+    rows[payment_row + 2] = {1: "CUENTA ", 3: rng.choice(["0102-0339250001071892", "0175-0162310074949290"])}
+    rows[payment_row + 3] = {1: "BENEFICIARIO:", 3: "SEDEMAT"}
+    rows[payment_row + 4] = {1: "FECHA:", 3: issued.strftime("%d/%m/%Y")}
+    rows[payment_row + 5] = {1: "REFERENCIA", 3: str(rng.randint(100000, 999999999))}
+    rows[payment_row + 6] = {1: "VERIFICADO POR:", 4: "ANALISTA"}
+
+    return rows
+
+
+def _append_rows(sheet, rows, last_column=8):
+    for row_number in range(1, max(rows) + 1):
+        values = rows.get(row_number, {})
+        sheet.append([values.get(column) for column in range(1, last_column + 1)])
+
+
+def generate_receipt_workbook(path, size, seed=0):
+    """
+    a comprobante workbook: a first "PARTIDAS" sheet and one receipt sheet per comprobante
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+
+    workbook.create_sheet("PARTIDAS").append(["PARTIDAS"])
+
+    for i in range(size):
+        number = FIRST_RECEIPT_NUMBER + i
+        issued = date(2024, 4, 1) + timedelta(days=i % 28)
+
+        _append_rows(workbook.create_sheet(str(number)), _receipt_rows(rng, number, issued))
+
+    workbook.save(path)
+    return path
+
+
+def generate_patente_workbook(path, size, seed=0):
+    """
+    a patente workbook mixing the "patentes" (E8) and "taquilla" (E11) layouts
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+
+    for i in range(size):
+        taquilla = i % 2 == 1
+        offset = 5 if taquilla else 0
+
+        rows = {
+            (11 if taquilla else 8): {5: str(i) if taquilla else f"Nº: {i}"},
+            (14 if taquilla else 9): {2: "PUERTO CUMAREBO 3 DE MAYO DE 2024"},
+            14 + offset: {3: f"CONTRIBUYENTE {i}", 6: f"V-{rng.randint(1000000, 30000000)}"},
+            15 + offset: {3: "MODELO", 6: "MARCA"},
+            16 + offset: {3: rng.randint(1990, 2024), 6: "BLANCO"},
+            17 + offset: {3: f"AB{i:05d}", 6: "PARTICULAR"},
+            19 + offset: {6: f"{_ve_amount(rng.uniform(10, 500))} BS"},
+        }
+
+        _append_rows(workbook.create_sheet(f"P{i}"), rows, last_column=6)
+
+    workbook.save(path)
+    return path
+
+
+def generate_statements(directory, size, month=1, year=2024, seed=0):
+    """
+    the four consolidador inputs for one month, inside directory/datos/:
+    account_statements/{mm}-{yy}-9290.xlsx, {mm}-{yy}-1892.xlsx, {mm}-{yy}-biopago.xlsx
+    and settlements/cuadro_to_use.xlsx
+
+    about two thirds of the payments have a settlement with the last digits of their reference.
+    one in ten of the settled 9290 payments is followed by a bank commission with the same
+    reference, dated on the settlement fecha_pago so it is the closest hit (--one-to-one must
+    still give the settlement to the taxpayer payment)
+    """
+    rng = random.Random(seed)
+    mm = f"{month:02d}"
+    yy = str(year)[-2:]
+
+    statements_dir = os.path.join(directory, "datos", "account_statements")
+    settlements_dir = os.path.join(directory, "datos", "settlements")
+    os.makedirs(statements_dir, exist_ok=True)
+    os.makedirs(settlements_dir, exist_ok=True)
+
+    def day():
+        return date(year, month, rng.randint(1, 28))
+
+    def description():
+        return rng.choice(["PAGO MOVIL", "TRANSFERENCIA", "DEPOSITO", "COMISION POR SERVICIO", "SALDO INICIAL"])
+
+    references_9290 = [rng.randint(10 ** 8, 10 ** 12) for _ in range(size)]
+    credits_9290 = [round(rng.uniform(1, 10000), 2) for _ in range(size)]
+
+    statement_9290 = pd.DataFrame({
+        "Fecha": [day().strftime("%d-%m-%Y") for _ in range(size)],
+        "Referencia": references_9290,
+        "Código": [rng.randint(1, 99) for _ in range(size)],
+        "Descripción": [description() for _ in range(size)],
+        "Débito": [None] * size,
+        "Crédito": credits_9290,
+        "Saldo": [0.0] * size,
+    })
+
+    references_1892 = [str(rng.randint(10 ** 6, 10 ** 12)) for _ in range(size)]
+    amounts_1892 = [round(rng.uniform(1, 10000), 2) for _ in range(size)]
+
+    pd.DataFrame({
+        "fecha": [day().strftime("%d/%m/%Y") for _ in range(size)],
+        "referencia": references_1892,
+        "concepto": [description() for _ in range(size)],
+        "saldo": [0.0] * size,
+        "month": [month] * size,
+        "tipoMovimiento": ["NC"] * size,
+        "rif": ["G200127686"] * size,
+        "numeroCuenta": ["01020339250001071892"] * size,
+        "monto": [_ve_amount(amount) for amount in amounts_1892],
+    }).to_excel(os.path.join(statements_dir, f"{mm}-{yy}-1892.xlsx"), sheet_name="data", index=False)
+
+    biopago_size = max(1, size // 10)
+
+    pd.DataFrame({
+        "Nro.": range(1, biopago_size + 1),
+        "Fecha": [day().strftime("%d/%m/%Y") for _ in range(biopago_size)],
+        "Instrumento": ["TDD"] * biopago_size,
+        "Emisor": ["BDV"] * biopago_size,
+        "Monto": [round(rng.uniform(1, 500), 2) for _ in range(biopago_size)],
+        "Equipo": ["BIOPAGO 1"] * biopago_size,
+        "Lote": [1] * biopago_size,
+        "Cédula Pagador": [rng.randint(1000000, 30000000) for _ in range(biopago_size)],
+        "Resultado": ["APROBADA"] * biopago_size,
+        "Autorización": [rng.randint(100000, 999999) for _ in range(biopago_size)],
+    }).to_excel(os.path.join(statements_dir, f"{mm}-{yy}-biopago.xlsx"), index=False)
+
+    settlement_references = []
+    settlement_amounts = []
+
+    # (9290 payment position, settlement position)
+    settled_9290 = []
+
+    for index, (reference, amount) in enumerate(zip(references_9290 + references_1892, credits_9290 + amounts_1892)):
+        if rng.random() < 0.66:
+            if index < size:
+                settled_9290.append((index, len(settlement_references)))
+
+            fragment = str(reference)[-rng.randint(4, 8):]
+
+            # some settlements pay several transfers at once: "123456-654321"
+            if rng.random() < 0.1:
+                fragment = f"{fragment}-{rng.randint(100000, 999999)}"
+
+            settlement_references.append(fragment)
+            settlement_amounts.append(amount)
+
+    settlement_references.extend(["EXONERADO"] * max(1, size // 50))
+    settlement_amounts.extend([0.0] * max(1, size // 50))
+
+    count = len(settlement_references)
+
+    settlements = pd.DataFrame({
+        "razon_social": [f"CONTRIBUYENTE {i}" for i in range(count)],
+        "rif_cedula": [f"V-{rng.randint(1000000, 30000000)}" for _ in range(count)],
+        "num_comprobante": [float(FIRST_RECEIPT_NUMBER + i) for i in range(count)],
+        "pago_por": ["PATENTE DE INDUSTRIA Y COMERCIO"] * count,
+        "fecha_pago": [day().strftime("%d/%m/%Y") for _ in range(count)],
+        "fecha": [datetime.combine(day(), datetime.min.time()) for _ in range(count)],
+        "cuenta": ["1892"] * count,
+        "banco": ["VENEZUELA"] * count,
+        "referencia": settlement_references,
+        "monto": settlement_amounts,
+    })
+
+    commissions = [
+        (settlements["fecha_pago"][position].replace("/", "-"), references_9290[index], round(credits_9290[index] * 0.003, 2))
+        for index, position in settled_9290[::10]
+    ]
+
+    statement_9290 = pd.concat([statement_9290, pd.DataFrame({
+        "Fecha": [fecha for fecha, _, _ in commissions],
+        "Referencia": [reference for _, reference, _ in commissions],
+        "Código": [99] * len(commissions),
+        "Descripción": ["COMISION POR SERVICIO"] * len(commissions),
+        "Débito": [None] * len(commissions),
+        "Crédito": [amount for _, _, amount in commissions],
+        "Saldo": [0.0] * len(commissions),
+    })], ignore_index=True)
+
+    statement_9290.to_excel(os.path.join(statements_dir, f"{mm}-{yy}-9290.xlsx"), sheet_name="Table 2", index=False)
+    settlements.to_excel(os.path.join(settlements_dir, "cuadro_to_use.xlsx"), index=False)
+
+    return directory
@@ -1,286 +1,311 @@
 import time
-import locale
 import pandas as pd
 import os
+import sys
+import argparse
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# shared with the scrapers: the --profile report
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "liquidaciones"))
+
+import perfil
+from matcher import ReferenceMatcher, AmountDateMatcher
+from consolidation import (
+    OUTPUT_DIR, SETTLEMENTS_FILE, LoadError, month_key, load_settlements, load_settlements_db, timed_load,
+    submit_statements, collect_statements, normalize_payments, consolidate_payments, assign_payments,
+    find_candidates, orphan_settlements, store_payments, store_candidates, payments_file, candidates_file
+)
+
+# this program will check taht that the payments in account statement files, are in the settlement files for that month
+#
+# get for console input
+#   month (it can be a number from 1 to 12)
+#   year (it can be a number from 2020 to current year)
+#
+# or run several months without prompts
+#   python consolidador --months 2024-01..2025-06
 
-locale.setlocale(locale.LC_ALL, 'es_VE.utf8')
 
-# this program will check taht that the payments in account statement files, are in the settlement files for that month 
-# 
-# get for console input 
-#   month (it can be a number from 1 to 12) 
-#   year (it can be a number from 2020 to current year)
+def print_phase(name, seconds):
+    # every phase time goes to the console and, with --profile, to the profile report
+    perfil.sumar_fase(name, seconds)
+
+    print ('---- %s / %s seconds ----' % (name, seconds))
+
+
+def validate_month(month, year):
+    current_year = datetime.now().year
+
+    if not (1 <= month <= 12):
+        raise ValueError("Month must be between 1 and 12")
+
+    if not (2020 <= year <= current_year):
+        raise ValueError(f"Year must be between 2020 and {current_year}")
+
+
+def ask_month():
+    # ask user for month and year
+    month = input("Enter month (1-12): ")
+    year = input("Enter year (2020-current): ")
+
+    # validate month and year
+    current_year = datetime.now().year
+    current_month = datetime.now().month
+
+    if not year:
+        year = current_year
+    else:
+        year = int(year)
+
+    if not month:
+        month = current_month
+    else:
+        month = int(month)
+
+    validate_month(month, year)
+
+    return month, year
+
+
+def parse_months(text):
+    """
+    "2024-01..2025-06" => [(1, 2024), (2, 2024), ..., (6, 2025)], "2024-03" => [(3, 2024)]
+    """
+    first, _, last = text.partition("..")
+    last = last or first
+
+    try:
+        first_year, first_month = (int(part) for part in first.split("-"))
+        last_year, last_month = (int(part) for part in last.split("-"))
+    except ValueError:
+        raise ValueError(f"Invalid month range '{text}', expected YYYY-MM or YYYY-MM..YYYY-MM")
+
+    validate_month(first_month, first_year)
+    validate_month(last_month, last_year)
+
+    months = []
+    month, year = first_month, first_year
+
+    while (year, month) <= (last_year, last_month):
+        months.append((month, year))
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+
+    if not months:
+        raise ValueError(f"Invalid month range '{text}', the first month is after the last one")
+
+    return months
+
+
+def consolidate_month(mm, yy, statements, matcher, fallback=None, one_to_one=False):
+    """
+    runs the NORMALIZATION, CONSOLIDATION and STORE phases for one month and returns its summary
+    with a fallback matcher, the candidates of the payments without settlement are stored too
+    with one_to_one, each payment gets at most one settlement (see ReferenceMatcher.assign)
+    """
+    normalization_start_time = time.time()
+
+    payments, payment_references = normalize_payments(statements)
+
+    print_phase('normalized data', time.time() - normalization_start_time)
+
+    consolidation_start_time = time.time()
+
+    settled_positions = set()
+    consolidate = assign_payments if one_to_one else consolidate_payments
+    filteredPayments = consolidate(payments, payment_references, matcher, settled_positions)
+
+    print_phase('consolidated data', time.time() - consolidation_start_time)
+
+    candidates = None
+
+    if fallback is not None:
+        fallback_start_time = time.time()
+
+        candidates = find_candidates(payments, fallback, settled_positions)
+
+        print_phase('fallback candidates', time.time() - fallback_start_time)
+
+    store_start_time = time.time()
+
+    # the settlements left out of the consolidation, from the positions it matched
+    orphans = orphan_settlements(matcher.settlements, settled_positions, mm, yy)
+
+    stored = store_payments(payments, payments_file(mm, yy), orphans)
+
+    if candidates is not None:
+        store_candidates(candidates, candidates_file(mm, yy))
+
+    print_phase('store data', time.time() - store_start_time)
+
+    settled = stored["codigo_liquidacion"] != ''
+
+    summary = {
+        "mes": f"{mm}-{yy}",
+        "pagos": len(stored),
+        "liquidados": int(settled.sum()),
+        "no_liquidados": int((~settled).sum()),
+        "monto": stored["monto"].sum(),
+        "monto_liquidado": stored.loc[settled, "monto"].sum(),
+        "liquidaciones_sin_pago": len(orphans),
+    }
+
+    if candidates is not None:
+        summary["con_candidatos"] = candidates["referencia"].nunique() if len(candidates) else 0
+
+    return summary
+
+
+def build_matcher(df_settlements):
+    index_start_time = time.time()
+
+    # index the settlement references once, instead of scanning every settlement for each payment
+    matcher = ReferenceMatcher(df_settlements)
+
+    print_phase('indexed settlements', time.time() - index_start_time)
+
+    return matcher
+
+
+def build_fallback(df_settlements, date_window):
+    if date_window is None:
+        return None
+
+    index_start_time = time.time()
+
+    # settlements by amount and payment date, for the payments without a reference match
+    fallback = AmountDateMatcher(df_settlements, date_window)
+
+    print_phase('indexed settlements by amount', time.time() - index_start_time)
+
+    return fallback
+
+
+def print_load_timings(timings):
+    for path, seconds in timings.items():
+        print_phase('load %s' % os.path.basename(path), seconds)
+
+
+def submit_settlements(executor, use_cache=True, settlements_db=None):
+    # from the scraper database when given, otherwise from cuadro_to_use.xlsx
+    if settlements_db:
+        return settlements_db, executor.submit(timed_load, load_settlements_db, settlements_db, use_cache)
+
+    return SETTLEMENTS_FILE, executor.submit(timed_load, load_settlements, SETTLEMENTS_FILE, use_cache)
+
+
+def run_month(month, year, workers=4, use_cache=True, date_window=None, one_to_one=False, settlements_db=None):
+    startTime = time.time()
+
+    # format month and year for filenames
+    mm, yy = month_key(month, year)
+
+    # --------------------------
+    #          LOAD FASE
+    # --------------------------
+
+    # the four files are read at the same time, each one in its own process
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        submitted = submit_statements(executor, mm, yy, use_cache)
+        settlements_path, settlements_future = submit_settlements(executor, use_cache, settlements_db)
+
+        statements, timings = collect_statements(submitted)
+        df_settlements, timings[settlements_path] = settlements_future.result()
+
+    print_load_timings(timings)
+    print_phase('load data', time.time() - startTime)
+
+    for name, df in statements.items():
+        print(f"Account {name} statement loaded:", df.shape)
+    print("Settlements loaded (filtered):", df_settlements.shape)
+
+    matcher = build_matcher(df_settlements)
+    fallback = build_fallback(df_settlements, date_window)
+
+    consolidate_month(mm, yy, statements, matcher, fallback, one_to_one)
+
+
+def run_months(months, workers, use_cache=True, date_window=None, one_to_one=False, settlements_db=None):
+    """
+    loads the statements of every month and the settlements concurrently, indexes the
+    settlements once and consolidates each month, then writes a summary of all of them
+    """
+    startTime = time.time()
+
+    keys = [month_key(month, year) for month, year in months]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        settlements_path, settlements_future = submit_settlements(executor, use_cache, settlements_db)
+        statement_futures = [submit_statements(executor, mm, yy, use_cache) for mm, yy in keys]
+
+        df_settlements, settlements_seconds = settlements_future.result()
+        print_load_timings({settlements_path: settlements_seconds})
+        print("Settlements loaded (filtered):", df_settlements.shape)
+
+        matcher = build_matcher(df_settlements)
+        fallback = build_fallback(df_settlements, date_window)
+
+        summary = []
+
+        for (mm, yy), future in zip(keys, statement_futures):
+            print(f"==== {mm}-{yy} ====")
+
+            try:
+                statements, timings = collect_statements(future)
+            except LoadError as error:
+                print(f"skipping {mm}-{yy}, {error}")
+                summary.append({"mes": f"{mm}-{yy}", "error": str(error)})
+                continue
+
+            print_load_timings(timings)
 
-startTime = time.time()
-
-# ask user for month and year
-month = input("Enter month (1-12): ")
-year = input("Enter year (2020-current): ")
-
-
-
-# validate month and year
-current_year = datetime.now().year
-current_month = datetime.now().month
-
-if not year:
-    year = current_year
-else:
-    year = int(year)
-
-if not month:
-    month = current_month
-else:
-    month = int(month)
-
-
-if not (1 <= month <= 12):
-    raise ValueError("Month must be between 1 and 12")
-
-if not (2020 <= year <= current_year):
-    raise ValueError(f"Year must be between 2020 and {current_year}")
-
-# format month and year for filenames
-mm = f"{month:02d}"
-yy = str(year)[-2:]
-
-# --------------------------
-#          LOAD FASE
-# --------------------------
-
-# after you get the month and year, load the account statements for the accounts 1892 and 9290
-account_statements_dir = "./datos/account_statements"
-
-file_9290 = os.path.join(account_statements_dir, f"{mm}-{yy}-9290.xlsx")
-file_1892 = os.path.join(account_statements_dir, f"{mm}-{yy}-1892.xlsx")
-
-# for 9290
-#  look into the sheet "Table 2"
-#  it has the following columns
-#  1. Fecha
-#  2. Referencia
-#  3. Código 
-#  4. Descripción
-#  5. Débito
-#  6. Crédito
-#  7. Saldo
-df_9290 = pd.read_excel(file_9290, sheet_name="Table 2")
-
-# for 1892
-#  look into the sheet "data"
-#  it has the following columns
-#  1. fecha
-#  2. referencia
-#  3. concepto 
-#  4. saldo
-#  5. month
-#  6. tipoMovimiento
-#  7. rif
-#  8. numeroCuenta
-df_1892 = pd.read_excel(file_1892, sheet_name="data")
-
-# for biopago transactions, load the file from ./datos/account_statements/{MM}-{YY}-biopago.xlsx
-# it has the following columns
-# Nro.	Fecha	Instrumento	Emisor	Monto	Equipo	Lote	Cédula Pagador	Resultado	Autorización
-biopago_file = f"./datos/account_statements/{mm}-{yy}-biopago.xlsx"
-df_biopago = pd.read_excel(biopago_file, skiprows=[0], header=None, names=[
-    "number",
-    "date",
-    "instrument",
-    "issuer",
-    "amount",
-    "equipment",
-    "lot",
-    "payer_id",
-    "result",
-    "authorization"
-])
-
-# print("Biopago transactions loaded:", df_biopago.shape)
-# print(df_biopago.to_string())
-
-# load the settlments 
-# the file is in ./datos/settlements/cuadro-{MM}-{YY}.xlsx
-# it has the following columns
-# 1. razon_social
-# 2. rif_cedula
-# 3. num_comprobante
-# 4. pago_por
-# 5. fecha_pago
-# 6. fecha
-# 7. cuenta
-# 8. banco
-# 9. referncia
-# 10. monto
-# settlements_file = f"./datos/settlements/cuadro-{mm}-{yy}.xlsx"
-settlements_file = f"./datos/settlements/cuadro_to_use.xlsx"
-df_settlements = pd.read_excel(settlements_file)
-
-# in this case, remove all the settlements that has "EXONERADO" in refernece column
-# df_settlements = df_settlements[~df_settlements['referncia'].astype(str).str.contains("EXONERADO", case=False, na=False)]
-
-# now you have:
-# df_9290 → account 9290 statement
-# df_1892 → account 1892 statement
-# df_settlements → settlements (filtered)
-
-# here you would implement the logic to check that payments in account statements are in settlements
-# (matching by reference, amount, or other criteria depending on your business rules)
-
-print ('---- load data / %s seconds ----' % (time.time() - startTime))
-
-print("Account 9290 statement loaded:", df_9290.shape)
-print("Account 1892 statement loaded:", df_1892.shape)
-print("Settlements loaded (filtered):", df_settlements.shape)
-
-# print("Data in account 1892 statement:")
-# print(df_1892.to_string())
-
-# print("Data in account 9290 statement:")
-# print(df_9290.to_string())
-
-# ------------------------------------------
-#             NORMALIZATION FASE 
-# ------------------------------------------
-
-# the common structure for data will be
-#  1. reference 
-#  2. amount
-#  3. date
-#  4. bank
-#  5. account_number 
-
-# map the data in df_9290 and df_1892 into the common structure
-# 9290 => BDT
-# 1892 => BANCO DE VENEZUELA
-
-normalization_start_time = time.time()
-
-# normalize df_9290
-df_9290_norm = pd.DataFrame({
-    "reference": df_9290["Referencia"],
-    "amount": df_9290["Crédito"].fillna(0) - df_9290["Débito"].fillna(0),  # positive = credit, negative = debit
-    "date": pd.to_datetime(df_9290["Fecha"], format="%d-%m-%Y", errors="coerce"),
-    "bank": "BDT",
-    "account_number": "9290",
-    "description": df_9290["Descripción"],
-    "settlementCode": '',
-    "settlementDate": None
-})
-
-# normalize df_1892
-df_1892_norm = pd.DataFrame({
-    "reference": df_1892["referencia"],
-    "amount": df_1892["monto"],  # assuming saldo is the transaction amount
-    "date": pd.to_datetime(df_1892["fecha"], format="%d/%m/%Y", errors="coerce"),
-    "bank": "BANCO DE VENEZUELA",
-    "account_number": "1892",
-    "description": df_1892["concepto"],
-    "settlementCode": '',
-    "settlementDate": None
-})
-
-df_biopago_norm = pd.DataFrame({
-    "reference": df_biopago["number"],
-    "amount": df_biopago["amount"],
-    "date": pd.to_datetime(df_biopago["date"], format="%d/%m/%Y", errors="coerce"),
-    "bank": "BIOPAGO",
-    "account_number": "1892",
-    "description": df_biopago["equipment"],
-    "settlementCode": '',
-    "settlementDate": None
-})
-
-# merge then in a single object
-payments = pd.concat([df_9290_norm, df_1892_norm, df_biopago_norm], ignore_index=True)
-
-# print the list of payments
-# print("Normalized Payments:")
-# print(payments.to_string())
-
-
-print ('---- normalized data / %s seconds ----' % (time.time() - normalization_start_time))
-
-# ------------------------------------------
-#             CONSOLIDATION FASE 
-# ------------------------------------------
-
-consolidation_start_time = time.time()
-
-not_settled_payments = []
-
-paymentsDict = payments.to_dict(orient="records")
-filteredPaymentsDict = []
-
-# for each payment
-for index, payment in payments.iterrows():
+            summary.append(consolidate_month(mm, yy, statements, matcher, fallback, one_to_one))
 
-  # for each settlement
-  found = False
-  amount = 0
+    (first_mm, first_yy), (last_mm, last_yy) = keys[0], keys[-1]
+    summary_file = os.path.join(OUTPUT_DIR, f"payments_summary_{first_mm}_{first_yy}_{last_mm}_{last_yy}.xlsx")
 
-  if isinstance(payment["amount"], str):
-    amount = locale.atof(payment["amount"])
-    paymentsDict[index]["amount"] = amount
+    pd.DataFrame(summary).to_excel(summary_file, index=False)
 
-  description = str(payment["description"]).lower()
+    print(f"File {summary_file} generated with {len(summary)} months")
+    print_phase('total', time.time() - startTime)
 
-#   if not any(word in description for word in ["saldo inicial", "mantenimiento", "comision", "emision", "cargo", 'servicio'  ]) and amount > 0:
-#     continue
-
-  payment_reference = str(payment["reference"]).strip().split(".")[0]
-
-  for index_settlement, settlement in df_settlements.iterrows():
-    # if payment reference is included in settlement reference, continue with another payment
-    settlement_references = str(settlement["referencia"]).strip().split("-")
-
-    for st in settlement_references:
-      if payment_reference.endswith(st) and len(st) > 0:
-        found = True
-        paymentsDict[index]["settlementCode"] = str(int(settlement["num_comprobante"]))
-        paymentsDict[index]["settlementDate"] = datetime.strptime(str(settlement["fecha"]), "%Y-%m-%d %H:%M:%S").date()
-
-        filteredPaymentsDict.append(paymentsDict[index])
-
-print ('---- consolidated data / %s seconds ----' % (time.time() - consolidation_start_time))
-
-# ------------------------------------------
-#             STORE FASE 
-# ------------------------------------------
-
-store_start_time = time.time()
 
-# filter from paymentDict all the payments that contains the following words in description
-newPaymentsDict = []
+def main():
+    parser = argparse.ArgumentParser(description="checks the payments of the account statements against the settlements")
+    parser.add_argument("--months", help="month or month range to consolidate without prompts, e.g. 2024-01..2025-06")
+    parser.add_argument("--workers", type=int, default=4, help="processes used to load the input files")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the xlsx files instead of using the parsed copies in ./datos/.cache")
+    parser.add_argument("--date-window", type=int, metavar="DAYS",
+                        help="propose the settlements with the same amount paid up to DAYS days away for the payments "
+                             "without a reference match, in ./datos/payment_candidates_MM_YY.xlsx")
+    parser.add_argument("--one-to-one", action="store_true",
+                        help="match each payment to at most one settlement: longest reference suffix, "
+                             "then closest date, then same amount")
+    parser.add_argument("--settlements-db", metavar="SQLITE_FILE",
+                        help="read the settlements from the database written by the scraper (--sqlite) "
+                             "instead of ./datos/settlements/cuadro_to_use.xlsx")
+    parser.add_argument("--profile", metavar="JSON_FILE",
+                        help="write the time of every phase and the peak memory to this file")
+    args = parser.parse_args()
 
-for payment in paymentsDict: 
-   description = str(payment["description"]).lower()
-
-   if not any(word in description for word in ["saldo inicial", "mantenimiento", "comision", "emision", "cargo", 'servicio'  ]) and payment["amount"] > 0:
-      newPaymentsDict.append(payment)
-
-toPrintData = pd.DataFrame(newPaymentsDict)
-toPrintData.columns = [
-    "referencia",
-    "monto",
-    "fecha",
-    "banco",
-    "numero_cuenta",
-    "descripcion",
-    "codigo_liquidacion",
-    "fecha_liquidacion"
-]
-# print(toPrintData.to_string())
+    if args.profile:
+        perfil.activar()
 
-toPrintData.to_excel(f"./datos/payments_{mm}_{yy}.xlsx", index=False)
-# print(f"File ./datos/payments_{mm}_{yy}.xlsx generated with {len(payments)} payments")
+    try:
+        if args.months:
+            run_months(parse_months(args.months), args.workers, use_cache=not args.no_cache,
+                       date_window=args.date_window, one_to_one=args.one_to_one, settlements_db=args.settlements_db)
+        else:
+            run_month(*ask_month(), workers=args.workers, use_cache=not args.no_cache,
+                      date_window=args.date_window, one_to_one=args.one_to_one, settlements_db=args.settlements_db)
+    except LoadError as error:
+        sys.exit(f"Error: {error}")
 
-print ('---- store data / %s seconds ----' % (time.time() - store_start_time))
+    if args.profile:
+        perfil.guardar(args.profile)
 
 
-# generate an excel file with the payments not settled
-# not_settled_payments_df = pd.DataFrame(not_settled_payments)
-# not_settled_payments_file = f"./datos/not_settled_payments_{mm}_{yy}.xlsx"
-# not_settled_payments_df.to_excel(not_settled_payments_file, index=False)
-# print(f"File {not_settled_payments_file} generated with {len(not_settled_payments)} payments not settled")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import os
+import time
+import sqlite3
+import pandas as pd
+
+from normalization import payment_reference_keys, excluded_description_mask
+from statement_cache import cached_read_excel
+from statements import STATEMENT_ADAPTERS
+
+# the phases of the consolidation of one month
+#
+# LOAD => NORMALIZATION => CONSOLIDATION => STORE
+#
+# they only take and return data, so __main__ can time them, run them for
+# several months and reuse the settlements index between months
+
+SETTLEMENTS_FILE = "./datos/settlements/cuadro_to_use.xlsx"
+OUTPUT_DIR = "./datos"
+
+CANDIDATE_COLUMNS = [
+    "referencia",
+    "monto",
+    "fecha",
+    "banco",
+    "numero_cuenta",
+    "codigo_liquidacion",
+    "referencia_liquidacion",
+    "fecha_pago_liquidacion",
+    "diferencia_dias",
+    "puntaje"
+]
+
+
+def month_key(month, year):
+    # (1, 2024) => ("01", "24"), the format used in the file names
+    return f"{month:02d}", str(year)[-2:]
+
+
+def statement_files(mm, yy):
+    return {name: adapter.file(mm, yy) for name, adapter in STATEMENT_ADAPTERS.items()}
+
+
+# --------------------------
+#          LOAD FASE
+# --------------------------
+
+def read_excel(path, use_cache, **read_options):
+    if use_cache:
+        return cached_read_excel(path, **read_options)
+
+    return pd.read_excel(path, **read_options)
+
+
+class LoadError(Exception):
+    """
+    an input file could not be loaded, path names the file
+    """
+
+    def __init__(self, path, reason):
+        super().__init__(path, reason)
+        self.path = path
+        self.reason = reason
+
+    def __str__(self):
+        return f"could not load {self.path}: {self.reason}"
+
+
+def load_settlements(path=SETTLEMENTS_FILE, use_cache=True):
+    """
+    loads the settlements, it has the following columns
+    1. razon_social
+    2. rif_cedula
+    3. num_comprobante
+    4. pago_por
+    5. fecha_pago
+    6. fecha
+    7. cuenta
+    8. banco
+    9. referencia
+    10. monto
+    """
+    # settlements_file = f"./datos/settlements/cuadro-{mm}-{yy}.xlsx"
+    df_settlements = read_excel(path, use_cache)
+
+    # in this case, remove all the settlements that has "EXONERADO" in refernece column
+    # df_settlements = df_settlements[~df_settlements['referncia'].astype(str).str.contains("EXONERADO", case=False, na=False)]
+
+    return df_settlements
+
+
+# the columns of cuadro_to_use.xlsx, from the liquidaciones table written by the scraper (--sqlite)
+SETTLEMENTS_QUERY = """
+    SELECT razon_social, rif_cedula, num_comprobante, pago_por, fecha_pago, fecha, cuenta, banco, referencia, monto
+    FROM liquidaciones
+"""
+
+
+def load_settlements_db(path, use_cache=True):
+    """
+    loads the settlements from the scraper database instead of the excel file, same columns as load_settlements
+    use_cache is ignored, the database is already fast to read
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No such file: '{path}'")
+
+    with sqlite3.connect(path) as connection:
+        df_settlements = pd.read_sql_query(SETTLEMENTS_QUERY, connection)
+
+    # the excel file has the dates as datetimes ("2024-04-25 00:00:00"), the database as text ("2024-04-25");
+    # fecha_pago is left as text, it can also be "EXONERADO" (see settlement_payment_dates)
+    df_settlements["fecha"] = pd.to_datetime(df_settlements["fecha"], errors="coerce")
+
+    return df_settlements
+
+
+def timed_load(loader, path, use_cache=True):
+    """
+    runs a loader and returns (DataFrame, seconds), any failure is raised as a LoadError naming the file
+    """
+    start_time = time.time()
+
+    try:
+        df = loader(path, use_cache)
+    except Exception as error:
+        raise LoadError(path, f"{type(error).__name__}: {error}") from None
+
+    return df, time.time() - start_time
+
+
+def submit_statements(executor, mm, yy, use_cache=True):
+    """
+    starts loading the statements of a month in the executor, one task per file
+    returns {name: (path, future)}
+    """
+    return {
+        name: (path, executor.submit(timed_load, STATEMENT_ADAPTERS[name].read, path, use_cache))
+        for name, path in statement_files(mm, yy).items()
+    }
+
+
+def collect_statements(submitted):
+    """
+    waits for the tasks of submit_statements and returns ({name: DataFrame}, {path: seconds})
+    """
+    statements = {}
+    timings = {}
+
+    for name, (path, future) in submitted.items():
+        statements[name], timings[path] = future.result()
+
+    return statements, timings
+
+
+# ------------------------------------------
+#             NORMALIZATION FASE
+# ------------------------------------------
+
+def normalize_payments(statements):
+    """
+    maps every statement ({name: DataFrame}) into the common structure with its adapter
+     1. reference
+     2. amount
+     3. date
+     4. bank
+     5. account_number
+
+    returns the payments and the key used to match them against the settlement references
+    """
+    normalized = [STATEMENT_ADAPTERS[name].normalize(df) for name, df in statements.items()]
+
+    # merge then in a single object
+    payments = pd.concat(normalized, ignore_index=True)
+
+    # the key used to match against the settlement references ("123456.0" => "123456")
+    payment_references = payment_reference_keys(payments["reference"])
+
+    return payments, payment_references
+
+
+# ------------------------------------------
+#             CONSOLIDATION FASE
+# ------------------------------------------
+
+def consolidate_payments(payments, payment_references, matcher, settled_positions=None):
+    """
+    sets settlementCode and settlementDate of every payment found in the settlements
+    and returns the matched payments, once per hit
+
+    the positions of the matched settlements are added to settled_positions when given
+    """
+    settlement_codes = payments["settlementCode"].tolist()
+    settlement_dates = payments["settlementDate"].tolist()
+
+    # one position per hit, a payment matching several settlements is repeated
+    filtered_positions = []
+
+    # for each payment
+    for index, payment_reference in enumerate(payment_references.tolist()):
+
+        # every settlement with a reference fragment that is a suffix of the payment reference
+        for position in matcher.find(payment_reference):
+            settlement_codes[index] = matcher.settlement_code(position)
+            settlement_dates[index] = matcher.settlement_date(position)
+
+            filtered_positions.append(index)
+
+            if settled_positions is not None:
+                settled_positions.add(position)
+
+    payments["settlementCode"] = settlement_codes
+    payments["settlementDate"] = settlement_dates
+
+    return payments.iloc[filtered_positions]
+
+
+def assign_payments(payments, payment_references, matcher, settled_positions=None):
+    """
+    same as consolidate_payments, but each payment is matched to at most one settlement
+    (see ReferenceMatcher.assign) and returned once. only the taxpayer payments compete for
+    the settlements, bank movements (fees, debits...) are never assigned one
+    """
+    assigned = matcher.assign(payment_references.tolist(), payments["amount"].tolist(), payments["date"].tolist(),
+                              taxpayer_payments_mask(payments).tolist())
+
+    settlement_codes = payments["settlementCode"].tolist()
+    settlement_dates = payments["settlementDate"].tolist()
+
+    for index, position in assigned.items():
+        settlement_codes[index] = matcher.settlement_code(position)
+        settlement_dates[index] = matcher.settlement_date(position)
+
+    payments["settlementCode"] = settlement_codes
+    payments["settlementDate"] = settlement_dates
+
+    if settled_positions is not None:
+        settled_positions.update(assigned.values())
+
+    return payments.iloc[sorted(assigned)]
+
+
+def find_candidates(payments, fallback, settled_positions=()):
+    """
+    second pass for the taxpayer payments left without a settlement: the settlements
+    with the same amount and a close fecha_pago (see AmountDateMatcher), that were not
+    matched by reference. returns one row per candidate, the best ones first
+    """
+    unmatched = payments[taxpayer_payments_mask(payments) & (payments["settlementCode"] == '')]
+
+    # one list per column instead of a dict per row
+    columns = {column: [] for column in CANDIDATE_COLUMNS}
+
+    for payment in unmatched.itertuples(index=False):
+        for score, position, difference in fallback.candidates(payment.amount, payment.date, settled_positions):
+            columns["referencia"].append(payment.reference)
+            columns["monto"].append(payment.amount)
+            columns["fecha"].append(payment.date)
+            columns["banco"].append(payment.bank)
+            columns["numero_cuenta"].append(payment.account_number)
+            columns["codigo_liquidacion"].append(fallback.settlement_code(position))
+            columns["referencia_liquidacion"].append(fallback.settlement_reference(position))
+            columns["fecha_pago_liquidacion"].append(fallback.settlement_payment_date(position))
+            columns["diferencia_dias"].append(difference)
+            columns["puntaje"].append(round(score, 3))
+
+    return pd.DataFrame(columns, columns=CANDIDATE_COLUMNS)
+
+
+# ------------------------------------------
+#             STORE FASE
+# ------------------------------------------
+
+def taxpayer_payments_mask(payments):
+    # positive amounts that are not bank movements (fees, opening balance...)
+    is_bank_movement = excluded_description_mask(payments["description"])
+
+    return ~is_bank_movement & (payments["amount"] > 0)
+
+
+def orphan_settlements(df_settlements, settled_positions, mm, yy):
+    """
+    the settlements dated in the month that no payment matched, leaving out the
+    exonerated ones (they are never paid)
+    """
+    dates = pd.to_datetime(df_settlements["fecha"], errors="coerce")
+    in_month = (dates.dt.month == int(mm)) & (dates.dt.year % 100 == int(yy))
+
+    exonerated = df_settlements["referencia"].map(str).str.contains("EXONERADO", case=False)
+
+    settled = pd.Series(False, index=df_settlements.index)
+    settled.iloc[sorted(settled_positions)] = True
+
+    return df_settlements[in_month & ~exonerated & ~settled]
+
+
+def store_payments(payments, output_file, orphans=None):
+    """
+    writes the taxpayer payments (positive amounts that are not bank movements) to output_file
+
+    the first sheet has all of them, then they are split in "liquidados" and
+    "no_liquidados", and the orphan settlements (if given) go to "liquidaciones_sin_pago"
+    """
+    toPrintData = payments[taxpayer_payments_mask(payments)].copy()
+    toPrintData.columns = [
+        "referencia",
+        "monto",
+        "fecha",
+        "banco",
+        "numero_cuenta",
+        "descripcion",
+        "codigo_liquidacion",
+        "fecha_liquidacion"
+    ]
+    # print(toPrintData.to_string())
+
+    settled = toPrintData["codigo_liquidacion"] != ''
+
+    with pd.ExcelWriter(output_file) as writer:
+        toPrintData.to_excel(writer, sheet_name="pagos", index=False)
+        toPrintData[settled].to_excel(writer, sheet_name="liquidados", index=False)
+        toPrintData[~settled].to_excel(writer, sheet_name="no_liquidados", index=False)
+
+        if orphans is not None:
+            orphans.to_excel(writer, sheet_name="liquidaciones_sin_pago", index=False)
+
+    return toPrintData
+
+
+def store_candidates(candidates, output_file):
+    candidates.to_excel(output_file, index=False)
+
+
+def payments_file(mm, yy):
+    return os.path.join(OUTPUT_DIR, f"payments_{mm}_{yy}.xlsx")
+
+
+def candidates_file(mm, yy):
+    return os.path.join(OUTPUT_DIR, f"payment_candidates_{mm}_{yy}.xlsx")
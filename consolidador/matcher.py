@@ -0,0 +1,237 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import pandas as pd
+
+from normalization import parse_amounts
+
+# matching engine between payments (account statements) and settlements
+#
+# a payment matches a settlement when the payment reference ends with one of
+# the "-" separated fragments of the settlement reference. instead of scanning
+# every settlement for every payment, the fragments are indexed once in a dict
+# and each payment only probes the suffixes of its own reference, which gives
+# the exact same hits as the `endswith` scan.
+#
+# by default every hit is kept (the payment is reported once per hit and the
+# last one sets its settlement), ReferenceMatcher.assign resolves the hits into
+# a one to one assignment instead.
+#
+# payments without a reference match (usually a mistyped reference in the
+# settlement) can be looked up by amount and date with AmountDateMatcher, which
+# only proposes candidates for a manual review.
+
+
+def payment_reference_key(reference):
+    # "123456.0" (references read as floats) => "123456"
+    return str(reference).strip().split(".")[0]
+
+
+class ReferenceMatcher:
+
+    def __init__(self, df_settlements):
+        self.settlements = df_settlements
+
+        # fragment => [(settlement position, fragment position), ...]
+        self.index = {}
+
+        references = df_settlements["referencia"].tolist()
+
+        for position, reference in enumerate(references):
+            fragments = str(reference).strip().split("-")
+
+            for fragment_position, fragment in enumerate(fragments):
+                if len(fragment) == 0:
+                    continue
+
+                self.index.setdefault(fragment, []).append((position, fragment_position))
+
+        self.codes = df_settlements["num_comprobante"].tolist()
+        self.dates = df_settlements["fecha"].tolist()
+
+    def find(self, payment_reference):
+        """
+        returns the positions of the settlements matched by a payment reference,
+        in the same order the nested loop used to find them (settlement order,
+        then fragment order). a settlement is repeated once per matching fragment.
+        """
+        hits = []
+
+        for start in range(len(payment_reference)):
+            hits.extend(self.index.get(payment_reference[start:], ()))
+
+        hits.sort()
+
+        return [position for position, _ in hits]
+
+    def settlement_code(self, position):
+        return str(int(self.codes[position]))
+
+    def settlement_date(self, position):
+        return datetime.strptime(str(self.dates[position]), "%Y-%m-%d %H:%M:%S").date()
+
+    def assign(self, payment_references, amounts, dates, eligible=None):
+        """
+        resolves the hits into a one to one assignment: each payment gets at most one
+        settlement and each fragment of a settlement reference at most one payment (a
+        settlement paying several transfers, "123456-654321", can take one per fragment)
+
+        eligible flags the payments that can take a settlement (all of them by default), so
+        a bank fee sharing the reference of a taxpayer payment can't take its fragment
+
+        every hit is ranked by the length of the matched suffix (longest first), the
+        days between the payment and the settlement fecha_pago (closest first), and whether
+        the amounts are equal, then by payment and settlement order so the result is
+        deterministic. the best hit left is taken until the heap is empty.
+
+        returns {payment index: settlement position}
+        """
+        settlement_days = [day_number(date) for date in settlement_payment_dates(self.settlements)]
+        settlement_amounts = parse_amounts(self.settlements["monto"]).tolist()
+
+        heap = []
+
+        for index, reference in enumerate(payment_references):
+            if eligible is not None and not eligible[index]:
+                continue
+
+            day = day_number(dates[index])
+            amount = amounts[index]
+
+            for start in range(len(reference)):
+                for position, fragment_position in self.index.get(reference[start:], ()):
+                    settlement_day = settlement_days[position]
+
+                    if day is None or settlement_day is None:
+                        distance = float("inf")
+                    else:
+                        distance = abs(settlement_day - day)
+
+                    settlement_amount = settlement_amounts[position]
+                    same_amount = (
+                        amount == amount and settlement_amount == settlement_amount
+                        and amount_key(amount) == amount_key(settlement_amount)
+                    )
+
+                    heap.append((start - len(reference), distance, not same_amount, index, position, fragment_position))
+
+        heapq.heapify(heap)
+
+        assigned = {}
+        used_fragments = set()
+
+        while heap:
+            _, _, _, index, position, fragment_position = heapq.heappop(heap)
+
+            if index in assigned or (position, fragment_position) in used_fragments:
+                continue
+
+            assigned[index] = position
+            used_fragments.add((position, fragment_position))
+
+        return assigned
+
+
+def amount_key(amount):
+    # amounts are compared in cents, 1234.5 and 1234.50 are the same amount
+    return round(amount * 100)
+
+
+def settlement_payment_dates(df_settlements):
+    # fecha_pago is the payment date written on the receipt, the one to compare with the bank
+    # transaction date; fecha is the issue date of the receipt. it comes as a date (excel file),
+    # as ISO text ("2024-04-25", scraper database) or as the receipt text ("25/04/2024", older
+    # excel files); anything else ("EXONERADO") has no date
+    values = df_settlements["fecha_pago"]
+    dates = pd.to_datetime(values, format="%d/%m/%Y", errors="coerce")
+
+    return dates.fillna(pd.to_datetime(values, format="ISO8601", errors="coerce")).tolist()
+
+
+def day_number(value):
+    # date / datetime / Timestamp => days since 01-01-0001, None and NaT => None
+    if value is None or value != value:
+        return None
+
+    return value.toordinal()
+
+
+class AmountDateMatcher:
+    """
+    finds the settlements with the exact amount of a payment and a fecha_pago at
+    most `days` days away from the payment date
+
+    the settlements are bucketed by amount and each bucket is sorted by date, so a
+    lookup is a dict access and two bisects instead of a scan of the settlements
+    """
+
+    def __init__(self, df_settlements, days=3):
+        self.days = days
+
+        amounts = parse_amounts(df_settlements["monto"]).tolist()
+        dates = settlement_payment_dates(df_settlements)
+
+        # amount in cents => [(day number, settlement position), ...] sorted
+        buckets = {}
+
+        for position, (amount, date) in enumerate(zip(amounts, dates)):
+            day = day_number(date)
+
+            if amount != amount or day is None:
+                continue
+
+            buckets.setdefault(amount_key(amount), []).append((day, position))
+
+        # two parallel lists per bucket, the days are the bisect keys
+        self.index = {}
+
+        for key, entries in buckets.items():
+            entries.sort()
+            self.index[key] = ([day for day, _ in entries], [position for _, position in entries])
+
+        self.codes = df_settlements["num_comprobante"].tolist()
+        self.references = df_settlements["referencia"].tolist()
+        self.payment_dates = dates
+
+    def candidates(self, amount, date, excluded=()):
+        """
+        returns [(score, settlement position, days between the payment and the settlement), ...]
+        best first, the score goes from 1 (same day) down to 1 / (days + 1)
+        settlements in excluded (already matched by reference) are left out
+        """
+        day = day_number(date)
+
+        if amount != amount or day is None:
+            return []
+
+        bucket = self.index.get(amount_key(amount))
+
+        if bucket is None:
+            return []
+
+        days, positions = bucket
+        first = bisect_left(days, day - self.days)
+        last = bisect_right(days, day + self.days)
+
+        found = []
+
+        for settlement_day, position in zip(days[first:last], positions[first:last]):
+            if position in excluded:
+                continue
+
+            difference = settlement_day - day
+            found.append((1 - abs(difference) / (self.days + 1), position, difference))
+
+        found.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+
+        return found
+
+    def settlement_code(self, position):
+        return str(int(self.codes[position]))
+
+    def settlement_reference(self, position):
+        return self.references[position]
+
+    def settlement_payment_date(self, position):
+        return self.payment_dates[position].date()
@@ -0,0 +1,49 @@
+import re
+import pandas as pd
+
+# column-wise normalization helpers for the account statements
+#
+# every function here works on a whole column at once, so the consolidation
+# loop receives amounts, dates and references already parsed.
+
+# payments with any of these words in the description are bank movements
+# (fees, opening balance...) and not taxpayer payments
+EXCLUDED_DESCRIPTION_WORDS = ["saldo inicial", "mantenimiento", "comision", "emision", "cargo", 'servicio']
+
+EXCLUDED_DESCRIPTION_PATTERN = "|".join(re.escape(word) for word in EXCLUDED_DESCRIPTION_WORDS)
+
+
+def parse_amounts(values):
+    """
+    parses amounts written in venezuelan format ("1.234,56") into floats,
+    numbers are kept as they are and anything unparseable becomes NaN
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+
+    values = values.astype(object)
+
+    try:
+        # non string cells become NaN here
+        text = values.str.strip().str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    except AttributeError:
+        # the column has no strings at all
+        return pd.to_numeric(values, errors="coerce")
+
+    parsed_text = pd.to_numeric(text, errors="coerce")
+    parsed_numbers = pd.to_numeric(values.where(text.isna()), errors="coerce")
+
+    return parsed_text.where(text.notna(), parsed_numbers).astype(float)
+
+
+def parse_dates(values, date_format):
+    return pd.to_datetime(values, format=date_format, errors="coerce")
+
+
+def payment_reference_keys(references):
+    # same as matcher.payment_reference_key, for the whole column
+    return references.map(str).str.strip().str.split(".").str[0]
+
+
+def excluded_description_mask(descriptions):
+    return descriptions.map(str).str.lower().str.contains(EXCLUDED_DESCRIPTION_PATTERN, regex=True)
@@ -0,0 +1,122 @@
+import os
+import pickle
+import hashlib
+import pandas as pd
+
+# on-disk cache of the parsed input files
+#
+# the first time a file is read its DataFrame is stored in CACHE_DIR as a feather
+# file (columnar, memory-mapped on read) when pyarrow is installed, or as a pickle
+# otherwise (and for columns pyarrow can't store, like numbers mixed with text).
+# the cache key includes the path, size and modification time of the source file,
+# so an edited statement is parsed again and its old cache entry is removed.
+#
+# an entry is written to a temp file next to it and moved into place, so a crash
+# or a concurrent run never leaves a half written entry under the final name; an
+# entry that can't be read anyway is removed and the source file parsed again.
+
+CACHE_DIR = "./datos/.cache"
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+def _source_key(path, read_options):
+    absolute_path = os.path.abspath(path)
+    stat = os.stat(absolute_path)
+
+    path_key = hashlib.blake2b(absolute_path.encode(), digest_size=8).hexdigest()
+    version_key = hashlib.blake2b(
+        f"{stat.st_size}:{stat.st_mtime_ns}:{sorted(read_options.items())!r}".encode(), digest_size=8).hexdigest()
+
+    return path_key, version_key
+
+
+def _remove(path):
+    # another run may have removed it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_stale(path_key, version_key):
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith(path_key + ".") and not name.startswith(f"{path_key}.{version_key}."):
+            _remove(os.path.join(CACHE_DIR, name))
+
+
+def _write_atomic(write, path):
+    # the temp name starts like the entry, so _remove_stale also cleans the ones left by a crash
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+
+def _write(df, base_path):
+    try:
+        if feather is not None:
+            try:
+                _write_atomic(lambda temp_path: feather.write_feather(df, temp_path), base_path + ".feather")
+                return
+            except (TypeError, ValueError):
+                # pyarrow rejects object columns mixing types, keep those as pickle
+                _remove(base_path + ".feather")
+
+        _write_atomic(df.to_pickle, base_path + ".pkl")
+    except OSError:
+        # the DataFrame is already parsed, the entry is written again on the next run. this happens when
+        # a run reading a newer version of the file removes the temp file as stale, or when another run
+        # has the entry open (windows doesn't replace a file in use)
+        pass
+
+
+# what reading a truncated or corrupt entry raises
+UNREADABLE_ENTRY_ERRORS = (OSError, ValueError, EOFError, pickle.UnpicklingError)
+
+
+def _read(base_path):
+    for extension in (".feather", ".pkl"):
+        entry_path = base_path + extension
+
+        if not os.path.exists(entry_path) or (extension == ".feather" and feather is None):
+            continue
+
+        try:
+            if extension == ".feather":
+                return feather.read_table(entry_path, memory_map=True).to_pandas()
+
+            return pd.read_pickle(entry_path)
+        except UNREADABLE_ENTRY_ERRORS:
+            # a cache miss, the source file is parsed again and the entry rewritten
+            _remove(entry_path)
+
+    return None
+
+
+def cached_read_excel(path, **read_options):
+    """
+    same as pd.read_excel(path, **read_options), served from the cache when the file didn't change
+    """
+    path_key, version_key = _source_key(path, read_options)
+    base_path = os.path.join(CACHE_DIR, f"{path_key}.{version_key}")
+
+    if os.path.isdir(CACHE_DIR):
+        df = _read(base_path)
+        if df is not None:
+            return df
+
+    df = pd.read_excel(path, **read_options)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _remove_stale(path_key, version_key)
+    _write(df, base_path)
+
+    return df
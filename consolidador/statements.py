@@ -0,0 +1,160 @@
+import os
+import pandas as pd
+
+from normalization import parse_amounts, parse_dates
+from statement_cache import cached_read_excel
+
+# the account statements the consolidador knows how to read
+#
+# every bank exports its statements with its own sheet, columns, date format and
+# amount convention, an adapter declares them and maps the statement into the
+# common structure of the payments. to consolidate a new account register an
+# adapter here, its file is ./datos/account_statements/{MM}-{YY}-{name}.xlsx
+#
+# the adapters only read the columns they use (usecols), with the text columns
+# read as object so pandas doesn't have to infer their type.
+
+ACCOUNT_STATEMENTS_DIR = "./datos/account_statements"
+
+PAYMENT_COLUMNS = [
+    "reference",
+    "amount",
+    "date",
+    "bank",
+    "account_number",
+    "description",
+    "settlementCode",
+    "settlementDate"
+]
+
+
+class StatementAdapter:
+    """
+    name: the suffix of the statement file ("9290" => 01-24-9290.xlsx)
+    bank, account_number: written in every payment of the statement
+    reference, date, description: columns of the statement
+    date_format: strptime format of the date column
+    amount: the amount column, or credit and debit: the amount is credit - debit
+      (positive = credit, negative = debit), a missing credit or debit counts as 0
+    read_options: passed to pd.read_excel (sheet_name, skiprows...)
+    text_columns: columns read with dtype object
+    """
+
+    def __init__(self, name, bank, account_number, reference, date, date_format, description,
+                 amount=None, credit=None, debit=None, read_options=None, text_columns=()):
+        if (amount is None) == (credit is None or debit is None):
+            raise ValueError(f"statement {name}: set either amount or credit and debit")
+
+        self.name = name
+        self.bank = bank
+        self.account_number = account_number
+        self.reference = reference
+        self.date = date
+        self.date_format = date_format
+        self.description = description
+        self.amount = amount
+        self.credit = credit
+        self.debit = debit
+        self.read_options = read_options or {}
+        self.text_columns = text_columns
+
+    def columns(self):
+        amount_columns = [self.amount] if self.amount is not None else [self.credit, self.debit]
+        return [self.reference, self.date, self.description, *amount_columns]
+
+    def file(self, mm, yy):
+        return os.path.join(ACCOUNT_STATEMENTS_DIR, f"{mm}-{yy}-{self.name}.xlsx")
+
+    def read(self, path, use_cache=True):
+        read_options = dict(self.read_options)
+        read_options.setdefault("usecols", self.columns())
+
+        if self.text_columns:
+            read_options["dtype"] = {column: object for column in self.text_columns}
+
+        if use_cache:
+            return cached_read_excel(path, **read_options)
+
+        return pd.read_excel(path, **read_options)
+
+    def amounts(self, df):
+        if self.amount is not None:
+            return parse_amounts(df[self.amount])
+
+        return parse_amounts(df[self.credit]).fillna(0) - parse_amounts(df[self.debit]).fillna(0)
+
+    def normalize(self, df):
+        """
+        maps the statement into the common structure of the payments (PAYMENT_COLUMNS)
+        """
+        return pd.DataFrame({
+            "reference": df[self.reference],
+            "amount": self.amounts(df),
+            "date": parse_dates(df[self.date], self.date_format),
+            "bank": self.bank,
+            "account_number": self.account_number,
+            "description": df[self.description],
+            "settlementCode": '',
+            "settlementDate": None
+        }, columns=PAYMENT_COLUMNS)
+
+
+# the adapters by name, the payments keep this order
+STATEMENT_ADAPTERS = {}
+
+
+def register(adapter):
+    if adapter.name in STATEMENT_ADAPTERS:
+        raise ValueError(f"statement {adapter.name} is already registered")
+
+    STATEMENT_ADAPTERS[adapter.name] = adapter
+    return adapter
+
+
+# BDT, the sheet "Table 2" has the columns
+#  Fecha, Referencia, Código, Descripción, Débito, Crédito, Saldo
+register(StatementAdapter(
+    name="9290",
+    bank="BDT",
+    account_number="9290",
+    reference="Referencia",
+    date="Fecha",
+    date_format="%d-%m-%Y",
+    description="Descripción",
+    credit="Crédito",
+    debit="Débito",
+    read_options={"sheet_name": "Table 2"},
+    text_columns=["Descripción"],
+))
+
+# BANCO DE VENEZUELA, the sheet "data" has the columns
+#  fecha, referencia, concepto, saldo, month, tipoMovimiento, rif, numeroCuenta, monto
+register(StatementAdapter(
+    name="1892",
+    bank="BANCO DE VENEZUELA",
+    account_number="1892",
+    reference="referencia",
+    date="fecha",
+    date_format="%d/%m/%Y",
+    description="concepto",
+    amount="monto",
+    read_options={"sheet_name": "data"},
+    text_columns=["concepto"],
+))
+
+# biopago transactions of the 1892 account, the columns are
+#  Nro.	Fecha	Instrumento	Emisor	Monto	Equipo	Lote	Cédula Pagador	Resultado	Autorización
+# read by position, skipping the header
+register(StatementAdapter(
+    name="biopago",
+    bank="BIOPAGO",
+    account_number="1892",
+    reference="number",
+    date="date",
+    date_format="%d/%m/%Y",
+    description="equipment",
+    amount="amount",
+    read_options={"skiprows": [0], "header": None, "usecols": [0, 1, 4, 5],
+                  "names": ["number", "date", "amount", "equipment"]},
+    text_columns=["equipment"],
+))
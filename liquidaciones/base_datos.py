@@ -0,0 +1,180 @@
+import sqlite3
+from datetime import date, datetime
+from registros import filas
+
+# Base de datos SQLite con lo extraído por los scrapers.
+#
+# Cada corrida agrega o actualiza sus registros (upsert por el número completo del
+# comprobante o por código de patente), así que la base acumula todos los meses y
+# el consolidador puede leer las liquidaciones de ahí en lugar de un cuadro de Excel.
+# num_comprobante (los últimos 5 caracteres del número) se repite de un año a otro,
+# así que no sirve de clave.
+#
+# Las fechas se guardan como texto ISO ("2024-04-25"), que SQLite compara y ordena.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS liquidaciones (
+    num_comprobante_completo TEXT PRIMARY KEY,
+    num_comprobante TEXT,
+    razon_social TEXT,
+    rif_cedula TEXT,
+    pago_por TEXT,
+    fecha_pago TEXT,
+    fecha TEXT,
+    cuenta TEXT,
+    banco TEXT,
+    referencia TEXT,
+    monto REAL,
+    verificado_por TEXT,
+    es_cedula INTEGER
+);
+CREATE INDEX IF NOT EXISTS liquidaciones_referencia ON liquidaciones (referencia);
+CREATE INDEX IF NOT EXISTS liquidaciones_fecha ON liquidaciones (fecha);
+CREATE INDEX IF NOT EXISTS liquidaciones_num_comprobante ON liquidaciones (num_comprobante);
+
+CREATE TABLE IF NOT EXISTS conceptos (
+    id INTEGER PRIMARY KEY,
+    num_comprobante_completo TEXT NOT NULL REFERENCES liquidaciones (num_comprobante_completo) ON DELETE CASCADE,
+    num_comprobante TEXT,
+    partida TEXT,
+    descripcion TEXT,
+    monto REAL
+);
+CREATE INDEX IF NOT EXISTS conceptos_num_comprobante_completo ON conceptos (num_comprobante_completo);
+
+CREATE TABLE IF NOT EXISTS solvencias_inmobiliarias (
+    num_comprobante_completo TEXT PRIMARY KEY,
+    num_comprobante TEXT,
+    razon_social TEXT,
+    rif_cedula TEXT,
+    codigo_catastral TEXT,
+    direccion TEXT,
+    concepto TEXT
+);
+
+CREATE TABLE IF NOT EXISTS patentes (
+    codigo TEXT PRIMARY KEY,
+    razon_social TEXT,
+    cedula TEXT,
+    placa TEXT,
+    fecha TEXT,
+    monto REAL,
+    referencia TEXT,
+    marca TEXT,
+    modelo TEXT,
+    anio TEXT,
+    color TEXT,
+    uso TEXT
+);
+CREATE INDEX IF NOT EXISTS patentes_referencia ON patentes (referencia);
+CREATE INDEX IF NOT EXISTS patentes_fecha ON patentes (fecha);
+"""
+
+COLUMNAS_LIQUIDACIONES = ['num_comprobante_completo', 'num_comprobante', 'razon_social', 'rif_cedula', 'pago_por',
+                          'fecha_pago', 'fecha', 'cuenta', 'banco', 'referencia', 'monto', 'verificado_por', 'es_cedula']
+COLUMNAS_CONCEPTOS = ['num_comprobante_completo', 'num_comprobante', 'partida', 'descripcion', 'monto']
+COLUMNAS_SOLVENCIAS = ['num_comprobante_completo', 'num_comprobante', 'razon_social', 'rif_cedula', 'codigo_catastral',
+                       'direccion', 'concepto']
+# campo del registro => columna ("año" no es un buen nombre de columna)
+COLUMNAS_PATENTES = {
+    'codigo': 'codigo', 'razon_social': 'razon_social', 'cedula': 'cedula', 'placa': 'placa', 'fecha': 'fecha',
+    'monto': 'monto', 'referencia': 'referencia', 'marca': 'marca', 'modelo': 'modelo', 'año': 'anio',
+    'color': 'color', 'uso': 'uso',
+}
+
+
+# Cambia con cualquier cambio de ESQUEMA que no se pueda aplicar a una base ya creada
+# (2: las liquidaciones se identifican por el número completo del comprobante)
+VERSION_ESQUEMA = 2
+
+
+def abrir(ruta):
+    conexion = sqlite3.connect(ruta)
+
+    version = conexion.execute("PRAGMA user_version").fetchone()[0]
+    tablas = conexion.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+
+    if tablas and version != VERSION_ESQUEMA:
+        conexion.close()
+        raise ValueError(f"{ruta}: la base es de la versión {version or 1} del esquema, se esperaba la {VERSION_ESQUEMA}; "
+                         f"vuelva a generarla con los libros")
+
+    conexion.execute("PRAGMA foreign_keys = ON")
+    conexion.executescript(ESQUEMA)
+    conexion.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+
+    return conexion
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        valor = valor.date()
+
+    if isinstance(valor, date):
+        return valor.isoformat()
+
+    return valor
+
+
+def _upsert(tabla, columnas, clave):
+    actualizar = ", ".join(f"{columna} = excluded.{columna}" for columna in columnas if columna != clave)
+
+    return (
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))}) "
+        f"ON CONFLICT ({clave}) DO UPDATE SET {actualizar}"
+    )
+
+
+def _filas(registros, campos):
+    return [tuple(_valor(valor) for valor in fila) for fila in filas(registros, campos)]
+
+
+def guardar_liquidaciones(ruta, liquidaciones, conceptos, solvencias_inmobiliarias):
+    """
+    Agrega o actualiza las liquidaciones, sus conceptos y las solvencias en la base, en una sola transacción.
+
+    Los conceptos de cada liquidación guardada se reemplazan por los de esta corrida.
+    """
+    conexion = abrir(ruta)
+
+    try:
+        with conexion:
+            conexion.executemany(
+                _upsert("liquidaciones", COLUMNAS_LIQUIDACIONES, "num_comprobante_completo"),
+                _filas(liquidaciones, COLUMNAS_LIQUIDACIONES))
+
+            conexion.executemany(
+                "DELETE FROM conceptos WHERE num_comprobante_completo = ?",
+                [(liquidacion['num_comprobante_completo'],) for liquidacion in liquidaciones])
+
+            conexion.executemany(
+                f"INSERT INTO conceptos ({', '.join(COLUMNAS_CONCEPTOS)}) VALUES ({', '.join('?' * len(COLUMNAS_CONCEPTOS))})",
+                _filas(conceptos, COLUMNAS_CONCEPTOS))
+
+            conexion.executemany(
+                _upsert("solvencias_inmobiliarias", COLUMNAS_SOLVENCIAS, "num_comprobante_completo"),
+                _filas(solvencias_inmobiliarias, COLUMNAS_SOLVENCIAS))
+    finally:
+        conexion.close()
+
+    print(f"Base de datos {ruta}: {len(liquidaciones)} liquidaciones, {len(conceptos)} conceptos, "
+          f"{len(solvencias_inmobiliarias)} solvencias")
+
+
+def guardar_patentes(ruta, patentes):
+    """
+    Agrega o actualiza las patentes en la base por su código; las que no tienen código no se guardan.
+    """
+    con_codigo = [patente for patente in patentes if patente['codigo']]
+
+    conexion = abrir(ruta)
+
+    try:
+        with conexion:
+            conexion.executemany(
+                _upsert("patentes", list(COLUMNAS_PATENTES.values()), "codigo"),
+                _filas(con_codigo, list(COLUMNAS_PATENTES)))
+    finally:
+        conexion.close()
+
+    print(f"Base de datos {ruta}: {len(con_codigo)} patentes ({len(patentes) - len(con_codigo)} sin código)")
@@ -0,0 +1,56 @@
+import os
+import pickle
+import sqlite3
+import hashlib
+
+# Caché de extracción por hoja.
+#
+# Guarda en un archivo SQLite el resultado de extraer cada hoja, con una huella
+# del contenido de su ventana de celdas como clave. Al volver a procesar el mismo
+# libro solo se extraen las hojas nuevas o modificadas. La huella incluye la
+# versión del extractor, así que un cambio en las reglas invalida la caché.
+
+
+def ruta_cache_para(archivo_salida):
+    return os.path.splitext(archivo_salida)[0] + ".cache.sqlite"
+
+
+class CacheHojas:
+
+    def __init__(self, ruta, version, solo_lectura=False):
+        self.ruta = ruta
+        self.version = version.encode()
+
+        if solo_lectura:
+            # Los procesos de --workers solo consultan, las escrituras las hace el proceso principal
+            self.conexion = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+        else:
+            self.conexion = sqlite3.connect(ruta)
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS hojas (huella TEXT PRIMARY KEY, resultado BLOB NOT NULL)")
+            self.conexion.commit()
+
+        self.pendientes = []
+
+    def huella(self, ventana):
+        """
+        Huella del contenido de la ventana de la hoja (VentanaHoja), sin importar el título de la hoja.
+        """
+        h = hashlib.blake2b(self.version, digest_size=16)
+        h.update(repr(ventana.filas).encode())
+        return h.hexdigest()
+
+    def obtener(self, huella):
+        fila = self.conexion.execute("SELECT resultado FROM hojas WHERE huella = ?", (huella,)).fetchone()
+        return pickle.loads(fila[0]) if fila else None
+
+    def guardar(self, huella, resultado):
+        self.pendientes.append((huella, pickle.dumps(resultado, pickle.HIGHEST_PROTOCOL)))
+
+    def confirmar(self):
+        self.conexion.executemany("INSERT OR REPLACE INTO hojas (huella, resultado) VALUES (?, ?)", self.pendientes)
+        self.conexion.commit()
+        self.pendientes = []
+
+    def cerrar(self):
+        self.conexion.close()
@@ -0,0 +1,108 @@
+import os
+import csv
+import openpyxl
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
+from registros import filas
+
+# Exportación de los registros extraídos.
+#
+# Cada hoja de salida se describe con una tupla (titulo, campos, registros, nombre_tabla),
+# donde registros es una lista de registros (registros.py) o de diccionarios y nombre_tabla es None si la hoja no
+# lleva tabla de Excel. El libro se escribe en modo write_only, fila por fila, así que
+# no se arma en memoria una celda de openpyxl por cada valor.
+
+FORMATOS_ADICIONALES = ('csv', 'parquet')
+
+
+def _crear_tabla(nombre_tabla, campos, total_registros):
+    # +1 para contar la fila de cabecera
+    rango_tabla = f"A1:{get_column_letter(len(campos))}{total_registros + 1}"
+    tabla = Table(displayName=nombre_tabla, ref=rango_tabla)
+
+    # En modo write_only openpyxl no puede leer la cabecera de la hoja, así que
+    # las columnas de la tabla se declaran con los nombres de los campos
+    tabla.tableColumns = [TableColumn(id=i, name=campo) for i, campo in enumerate(campos, start=1)]
+    # _initialise_columns no se ejecuta con las columnas ya declaradas, así que el filtro de la cabecera se agrega aquí
+    tabla.autoFilter = AutoFilter(ref=rango_tabla)
+
+    tabla.tableStyleInfo = TableStyleInfo(
+        name="TableStyleMedium9", showFirstColumn=False,
+        showLastColumn=False, showRowStripes=True, showColumnStripes=True)
+
+    return tabla
+
+
+def exportar_libro(hojas, archivo_salida):
+    """
+    Escribe las hojas en un libro de Excel nuevo.
+
+    Args:
+    hojas (list): Tuplas (titulo, campos, registros, nombre_tabla).
+    archivo_salida (str): Ruta del archivo .xlsx de salida.
+    """
+    nuevo_libro = openpyxl.Workbook(write_only=True)
+
+    for titulo, campos, registros, nombre_tabla in hojas:
+        nueva_hoja = nuevo_libro.create_sheet(title=titulo)
+
+        if nombre_tabla:
+            nueva_hoja.add_table(_crear_tabla(nombre_tabla, campos, len(registros)))
+
+        nueva_hoja.append(campos)
+
+        for fila in filas(registros, campos):
+            nueva_hoja.append(fila)
+
+    nuevo_libro.save(archivo_salida)
+
+
+def _ruta_adicional(archivo_salida, titulo, extension):
+    base = os.path.splitext(archivo_salida)[0]
+    return f"{base}_{titulo}.{extension}"
+
+
+def exportar_csv(hojas, archivo_salida):
+    """
+    Escribe cada hoja como un CSV al lado del archivo de salida (salida_Titulo.csv).
+    """
+    for titulo, campos, registros, _ in hojas:
+        with open(_ruta_adicional(archivo_salida, titulo, 'csv'), 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(campos)
+
+            escritor.writerows(filas(registros, campos))
+
+
+def exportar_parquet(hojas, archivo_salida):
+    """
+    Escribe cada hoja como un Parquet al lado del archivo de salida (salida_Titulo.parquet).
+    Necesita pandas y pyarrow.
+    """
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError("Para exportar a Parquet se necesita pandas y pyarrow (pip install pandas pyarrow)")
+
+    for titulo, campos, registros, _ in hojas:
+        # Las columnas con valores mezclados (por ejemplo fecha_pago con 'EXONERADO') se guardan como texto
+        df = pd.DataFrame(list(filas(registros, campos)), columns=campos)
+        for campo in campos:
+            if df[campo].dtype == object:
+                df[campo] = df[campo].map(lambda valor: None if valor is None else str(valor))
+
+        df.to_parquet(_ruta_adicional(archivo_salida, titulo, 'parquet'), index=False)
+
+
+def exportar(hojas, archivo_salida, formatos=()):
+    """
+    Escribe el libro de Excel y, además, los formatos adicionales pedidos ('csv', 'parquet').
+    """
+    exportar_libro(hojas, archivo_salida)
+
+    if 'csv' in formatos:
+        exportar_csv(hojas, archivo_salida)
+
+    if 'parquet' in formatos:
+        exportar_parquet(hojas, archivo_salida)
@@ -0,0 +1,71 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+# Lectura de las fechas escritas en los comprobantes y en las patentes.
+#
+# Los libros escriben la misma fecha de varias formas:
+#   "25 DE ABRIL 2024"
+#   "PUERTO CUMAREBO, 3 DE MAYO DE 2024"
+#   "PUERTO CUMAREBO; 01 DE SEPTIEMBRE 2025"
+#   "25/04/2024" o "25-04-2024"
+# Los patrones se compilan una sola vez y cada texto se interpreta una sola vez:
+# en un libro del mes casi todas las hojas repiten las mismas pocas fechas.
+
+MESES = {
+    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4,
+    "MAYO": 5, "JUNIO": 6, "JULIO": 7, "AGOSTO": 8,
+    "SEPTIEMBRE": 9, "SETIEMBRE": 9, "OCTUBRE": 10, "NOVIEMBRE": 11, "DICIEMBRE": 12,
+}
+
+# "3 DE MAYO 2024", "3 DE MAYO DE 2024", "3 DE MAYO DEL 2024"
+_FECHA_EN_LETRAS = re.compile(r"(\d{1,2})\s+DE\s+([A-Z]+)\s*,?\s+(?:DEL?\s+)?(\d{4})", re.IGNORECASE)
+# "25/04/2024", "25-04-2024"
+_FECHA_NUMERICA = re.compile(r"(\d{1,2})([/-])(\d{1,2})\2(\d{4})")
+
+
+@lru_cache(maxsize=1024)
+def _fecha_de_texto(texto):
+    coincidencia = _FECHA_EN_LETRAS.search(texto)
+
+    if coincidencia:
+        dia, nombre_mes, anio = coincidencia.groups()
+        mes = MESES.get(nombre_mes.upper())
+    else:
+        coincidencia = _FECHA_NUMERICA.search(texto)
+
+        if not coincidencia:
+            return None
+
+        dia, _, mes, anio = coincidencia.groups()
+
+    if mes is None:
+        return None
+
+    try:
+        return date(int(anio), int(mes), int(dia))
+    except ValueError:
+        # Fecha inválida, como "31 DE ABRIL"
+        return None
+
+
+def extraer_fecha(valor):
+    """
+    Interpreta la fecha de una celda en cualquiera de los formatos de los libros.
+
+    Args:
+    valor (str, date o datetime): El texto de la celda, o la fecha si Excel ya la guardó como fecha.
+
+    Returns:
+    date: La fecha, o None si el valor no tiene una fecha válida.
+    """
+    if isinstance(valor, datetime):
+        return valor.date()
+
+    if isinstance(valor, date):
+        return valor
+
+    if not isinstance(valor, str):
+        return None
+
+    return _fecha_de_texto(valor)
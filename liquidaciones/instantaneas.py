@@ -0,0 +1,110 @@
+import os
+import gzip
+import pickle
+from ventana import VentanaHoja
+
+# Instantáneas de los libros de comprobantes.
+#
+# Abrir un libro grande con openpyxl es casi todo el tiempo del scraper, y un mes
+# ya cerrado se vuelve a procesar cada vez que cambian las reglas de extracción
+# (por ejemplo la clasificación de pago_por). Una instantánea guarda, en un
+# archivo <libro>.ventanas.gz, la ventana de celdas de cada hoja tal como se leyó
+# del libro (un pickle comprimido); el scraper la acepta como entrada en lugar del
+# libro y extrae de nuevo sin abrir el xlsx.
+#
+# Solo se guardan valores de celdas (textos, números, fechas), y al leer no se
+# acepta ningún otro tipo de objeto en el pickle.
+
+EXTENSION = ".ventanas.gz"
+
+# Cambia si cambia lo que se guarda en el archivo
+VERSION_FORMATO = 1
+
+# Los únicos objetos que pueden aparecer en una instantánea, además de los tipos básicos
+_CLASES_PERMITIDAS = {('datetime', 'datetime'), ('datetime', 'date'), ('datetime', 'time'), ('datetime', 'timedelta')}
+
+
+def es_instantanea(ruta):
+    return ruta.lower().endswith(EXTENSION)
+
+
+def ruta_instantanea(carpeta, archivo_excel):
+    return os.path.join(carpeta, os.path.basename(archivo_excel) + EXTENSION)
+
+
+def guardar_instantanea(ruta, ventanas):
+    """
+    Escribe las ventanas de las hojas de un libro en una instantánea.
+
+    Args:
+    ruta (str): Archivo de la instantánea.
+    ventanas (iterable): Las ventanas (VentanaHoja) de las hojas, todas con el mismo rango de celdas.
+
+    Returns:
+    int: La cantidad de hojas guardadas.
+    """
+    hojas = []
+    rango = None
+
+    for ventana in ventanas:
+        rango = (ventana.min_fila, ventana.max_fila, ventana.min_col, ventana.max_col)
+        hojas.append((ventana.title, ventana.filas))
+
+    contenido = {'formato': VERSION_FORMATO, 'rango': rango, 'hojas': hojas}
+
+    # Se escribe en un archivo temporal y se reemplaza, para no dejar una instantánea a medias
+    temporal = f"{ruta}.tmp"
+
+    with gzip.open(temporal, 'wb') as archivo:
+        pickle.dump(contenido, archivo, pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temporal, ruta)
+
+    return len(hojas)
+
+
+class _Lector(pickle.Unpickler):
+
+    def find_class(self, modulo, nombre):
+        if (modulo, nombre) not in _CLASES_PERMITIDAS:
+            raise pickle.UnpicklingError(f"objeto no permitido en una instantánea: {modulo}.{nombre}")
+
+        return super().find_class(modulo, nombre)
+
+
+def leer_instantanea(ruta, min_fila, max_fila, min_col=1, max_col=8):
+    """
+    Lee las ventanas de una instantánea, comprobando que cubran el rango que se va a extraer.
+
+    Args:
+    ruta (str): Archivo de la instantánea.
+    min_fila, max_fila, min_col, max_col (int): El rango de celdas que necesita la extracción.
+
+    Raises:
+    ValueError: Si la instantánea es de otro formato o se hizo con una ventana que no cubre el rango.
+
+    Returns:
+    list: Las ventanas (VentanaHoja) de las hojas, en el orden del libro.
+    """
+    with gzip.open(ruta, 'rb') as archivo:
+        contenido = _Lector(archivo).load()
+
+    if contenido.get('formato') != VERSION_FORMATO:
+        raise ValueError(f"{ruta}: instantánea de formato {contenido.get('formato')}, se esperaba {VERSION_FORMATO}")
+
+    hojas = contenido['hojas']
+
+    if not hojas:
+        return []
+
+    fila_inicial, fila_final, col_inicial, col_final = contenido['rango']
+
+    if not (fila_inicial <= min_fila and max_fila <= fila_final and col_inicial <= min_col and max_col <= col_final):
+        raise ValueError(f"{ruta}: la instantánea cubre las filas {fila_inicial}-{fila_final} y las columnas "
+                         f"{col_inicial}-{col_final}, la extracción necesita {min_fila}-{max_fila} y {min_col}-{max_col}; "
+                         f"vuelva a generarla desde el libro")
+
+    return [
+        VentanaHoja(titulo, filas, fila_inicial, fila_final, col_inicial, col_final)
+        for titulo, filas in hojas
+    ]
@@ -0,0 +1,259 @@
+import sys
+import time
+import argparse
+import warnings
+import openpyxl
+from openpyxl.utils import coordinate_to_tuple, get_column_letter
+from ventana import leer_ventana
+from fechas import extraer_fecha
+from exportacion import exportar_libro
+import perfil
+import base_datos
+from registros import Patente
+
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+# Motor de extracción de las patentes.
+#
+# patentes.py, patente_cheo.py y patente_taquilla.py leen los mismos campos de
+# celdas distintas. Aquí cada formato se describe con una plantilla (celda y
+# función de lectura de cada campo, más las celdas ancla que lo identifican),
+# cada hoja se lee de una sola vez en una ventana que cubre todas sus celdas y,
+# en modo automático, la plantilla de cada hoja se detecta con sus anclas. Así
+# una carpeta con libros de taquilla y de cheo se procesa en una sola pasada.
+
+
+def leer_texto(valor):
+    return valor
+
+
+def leer_codigo(valor):
+    if valor and isinstance(valor, str):
+        valor = valor.strip().replace("Nº: ", "")
+
+    return valor
+
+
+def leer_fecha(valor):
+    """
+    Convierte "PUERTO CUMAREBO 3 DE MAYO DE 2024" en una fecha; si no se reconoce se deja el texto.
+    """
+    fecha = extraer_fecha(valor)
+
+    return fecha if fecha is not None else valor
+
+
+def leer_monto(valor):
+    """
+    Convierte montos como "1.234,56 BS" o "1234,56" en float; los números se dejan como están.
+    """
+    if not valor or not isinstance(valor, str):
+        return valor
+
+    monto = valor.strip()
+    monto = monto.replace(" BS", "")
+    monto = monto.replace("BS", "")
+
+    # Formato venezolano: punto para los miles y coma para los decimales
+    if ',' in monto:
+        monto = monto.replace('.', '').replace(',', '.')
+
+    return float(monto) if monto else None
+
+
+def tiene_valor(valor):
+    return valor is not None and valor != ""
+
+
+def es_fecha_cumarebo(valor):
+    return isinstance(valor, str) and "CUMAREBO" in valor.upper()
+
+
+class Plantilla:
+
+    def __init__(self, nombre, campos, anclas):
+        """
+        Args:
+        nombre (str): Nombre de la plantilla.
+        campos (dict): campo => (celda, función que convierte el valor de la celda).
+        anclas (list): Tuplas (celda, prueba) que deben cumplirse para que una hoja use esta plantilla.
+        """
+        self.nombre = nombre
+        self.campos = campos
+        self.anclas = anclas
+
+        celdas = [coordinate_to_tuple(celda) for celda, _ in list(campos.values()) + anclas]
+        self.min_fila = min(fila for fila, _ in celdas)
+        self.max_fila = max(fila for fila, _ in celdas)
+        self.min_col = min(columna for _, columna in celdas)
+        self.max_col = max(columna for _, columna in celdas)
+
+    def coincide(self, ventana):
+        return all(prueba(ventana[celda].value) for celda, prueba in self.anclas)
+
+    def extraer(self, ventana):
+        patente = Patente(**{campo: leer(ventana[celda].value) for campo, (celda, leer) in self.campos.items()})
+        patente.referencia = ""
+
+        return patente
+
+
+PLANTILLAS = {
+    'patentes': Plantilla('patentes', {
+        "codigo": ('E8', leer_codigo),
+        "cedula": ('F14', leer_texto),
+        "razon_social": ('C14', leer_texto),
+        "placa": ('C17', leer_texto),
+        "monto": ('F19', leer_monto),
+        "fecha": ('B9', leer_fecha),
+        "marca": ('F15', leer_texto),
+        "modelo": ('C15', leer_texto),
+        "año": ('C16', leer_texto),
+        "color": ('F16', leer_texto),
+        "uso": ('F17', leer_texto),
+    }, anclas=[('B9', es_fecha_cumarebo), ('E8', tiene_valor)]),
+
+    'taquilla': Plantilla('taquilla', {
+        "codigo": ('E11', leer_texto),
+        "cedula": ('F19', leer_texto),
+        "razon_social": ('C19', leer_texto),
+        "placa": ('C22', leer_texto),
+        "monto": ('F24', leer_monto),
+        "fecha": ('B14', leer_fecha),
+        "marca": ('F20', leer_texto),
+        "modelo": ('C20', leer_texto),
+        "año": ('C21', leer_texto),
+        "color": ('F21', leer_texto),
+        "uso": ('F22', leer_texto),
+    }, anclas=[('B14', es_fecha_cumarebo), ('E11', tiene_valor)]),
+}
+
+# Los libros de cheo usan las mismas celdas que los de patentes
+PLANTILLAS['cheo'] = PLANTILLAS['patentes']
+
+# Orden en que se prueban las plantillas en modo automático
+ORDEN_DETECCION = ['taquilla', 'patentes']
+
+CAMPOS_PATENTE = ['codigo', 'razon_social', 'cedula', 'placa', 'fecha', 'monto', 'referencia', 'marca', 'modelo', 'año', 'color', 'uso']
+
+
+def _rango(plantillas):
+    return (
+        min(p.min_fila for p in plantillas), max(p.max_fila for p in plantillas),
+        get_column_letter(min(p.min_col for p in plantillas)), get_column_letter(max(p.max_col for p in plantillas)),
+    )
+
+
+def detectar_plantilla(ventana):
+    """
+    Devuelve la primera plantilla cuyas anclas se cumplen en la ventana, o None.
+    """
+    for nombre in ORDEN_DETECCION:
+        if PLANTILLAS[nombre].coincide(ventana):
+            return PLANTILLAS[nombre]
+
+    return None
+
+
+def extraer_patentes(archivo_excel, plantilla=None):
+    """
+    Extrae una patente por hoja del libro.
+
+    Args:
+    archivo_excel (str): Ruta del libro.
+    plantilla (str o None): Nombre de la plantilla a usar en todas las hojas, o None para detectarla en cada hoja.
+
+    Returns:
+    list: Las patentes (Patente), en el orden de las hojas.
+    """
+    plantillas = [PLANTILLAS[plantilla]] if plantilla else [PLANTILLAS[nombre] for nombre in ORDEN_DETECCION]
+    min_fila, max_fila, min_col, max_col = _rango(plantillas)
+
+    patentes = []
+
+    with perfil.fase("carga del libro"):
+        libro = openpyxl.load_workbook(archivo_excel, read_only=True, data_only=True)
+
+    try:
+        for hoja in libro.worksheets:
+            # Una sola lectura por hoja con todas las celdas que usan las plantillas
+            ventana = leer_ventana(hoja, min_fila, max_fila, min_col, max_col)
+
+            inicio = time.perf_counter()
+
+            plantilla_hoja = plantillas[0] if plantilla else detectar_plantilla(ventana)
+
+            if plantilla_hoja is None:
+                print(f"Formato de patente no reconocido: {archivo_excel} / {hoja.title}")
+                perfil.sumar_hoja(ventana, time.perf_counter() - inicio)
+                continue
+
+            patentes.append(plantilla_hoja.extraer(ventana))
+            perfil.sumar_hoja(ventana, time.perf_counter() - inicio)
+    finally:
+        libro.close()
+
+    return patentes
+
+
+def procesar_libros(libros, archivo_salida, plantilla=None, ruta_sqlite=None):
+    patentes = []
+
+    for archivo_excel in libros:
+        patentes.extend(extraer_patentes(archivo_excel, plantilla))
+
+    with perfil.fase("exportacion"):
+        exportar_libro([("patentes", CAMPOS_PATENTE, patentes, None)], archivo_salida)
+
+    if ruta_sqlite:
+        with perfil.fase("base de datos"):
+            base_datos.guardar_patentes(ruta_sqlite, patentes)
+
+    return patentes
+
+
+def main(plantilla=None):
+    """
+    Línea de comandos del motor de patentes.
+
+    Args:
+    plantilla (str o None): Para los scripts de cada formato (patentes.py, patente_cheo.py,
+    patente_taquilla.py): usar esta plantilla en todas las hojas, sin la opción --plantilla.
+    """
+    from scraper import listar_libros
+
+    if plantilla:
+        descripcion = f"Extrae las patentes de libros con la plantilla '{plantilla}'."
+    else:
+        descripcion = "Extrae las patentes de libros de taquilla, cheo o patentes."
+
+    parser = argparse.ArgumentParser(description=descripcion)
+    parser.add_argument("entradas", nargs="+", help="Libros o carpetas con libros de patentes")
+    parser.add_argument("archivo_salida", help="Archivo .xlsx de salida")
+    if not plantilla:
+        parser.add_argument("--plantilla", choices=sorted(PLANTILLAS), default=None,
+                            help="Usar esta plantilla en todas las hojas en lugar de detectarla")
+    parser.add_argument("--sqlite", metavar="ARCHIVO_DB",
+                        help="Agregar o actualizar también las patentes en esta base SQLite")
+    parser.add_argument("--profile", metavar="ARCHIVO_JSON",
+                        help="Guardar en este archivo los tiempos de cada fase y de cada hoja, las celdas leídas y la memoria máxima")
+    args = parser.parse_args()
+
+    if args.profile:
+        perfil.activar()
+
+    libros = [libro for entrada in args.entradas for libro in listar_libros(entrada)]
+
+    if not libros:
+        print("Error: no se encontraron libros")
+        sys.exit(1)
+
+    patentes = procesar_libros(libros, args.archivo_salida, plantilla or args.plantilla, args.sqlite)
+    print(f"{len(patentes)} patentes de {len(libros)} libros")
+
+    if args.profile:
+        perfil.guardar(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import sys
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Perfil de una ejecución (--profile).
+#
+# Junta en un solo lugar el tiempo de cada fase (carga del libro, lectura de las
+# ventanas, extracción, fecha, exportación...), el tiempo y las celdas leídas de
+# cada hoja, la memoria máxima y los mensajes de depuración, y los escribe en un
+# JSON. Mientras no se active, las funciones del módulo no hacen nada, así que
+# los extractores pueden llamarlas siempre.
+
+_SIN_PERFIL = nullcontext()
+
+
+class Perfil:
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        # fase => segundos
+        self.fases = {}
+        # (título de la hoja, segundos, celdas leídas)
+        self.hojas = []
+        self.mensajes = []
+
+    def sumar_fase(self, nombre, segundos):
+        self.fases[nombre] = self.fases.get(nombre, 0.0) + segundos
+
+    @contextmanager
+    def fase(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar_fase(nombre, time.perf_counter() - inicio)
+
+    def sumar_hoja(self, titulo, segundos, celdas):
+        self.hojas.append((titulo, segundos, celdas))
+
+    def mensaje(self, *valores):
+        self.mensajes.append(" ".join(str(valor) for valor in valores))
+
+    def datos(self):
+        """
+        Devuelve lo anotado, para juntarlo con el perfil de otro proceso.
+        """
+        return self.fases, self.hojas, self.mensajes
+
+    def juntar(self, datos):
+        fases, hojas, mensajes = datos
+
+        for nombre, segundos in fases.items():
+            self.sumar_fase(nombre, segundos)
+
+        self.hojas.extend(hojas)
+        self.mensajes.extend(mensajes)
+
+    def resumen(self, cantidad_hojas_lentas=20):
+        """
+        Returns:
+        dict: total_segundos, fases, hojas, celdas_leidas, hojas_mas_lentas, memoria_pico_kb
+        (de este proceso y de sus procesos hijos) y depuracion.
+        """
+        lentas = sorted(self.hojas, key=lambda hoja: hoja[1], reverse=True)[:cantidad_hojas_lentas]
+
+        return {
+            "total_segundos": time.perf_counter() - self.inicio,
+            "fases": dict(sorted(self.fases.items(), key=lambda fase: fase[1], reverse=True)),
+            "hojas": len(self.hojas),
+            "celdas_leidas": sum(celdas for _, _, celdas in self.hojas),
+            "hojas_mas_lentas": [
+                {"hoja": titulo, "segundos": segundos, "celdas": celdas}
+                for titulo, segundos, celdas in lentas
+            ],
+            "memoria_pico_kb": memoria_pico_kb(),
+            "depuracion": self.mensajes,
+        }
+
+    def guardar(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump(self.resumen(), archivo, indent=2, ensure_ascii=False, default=str)
+
+
+def memoria_pico_kb():
+    if resource is None:
+        return None
+
+    # Linux informa KB y macOS bytes
+    escala = 1024 if sys.platform == "darwin" else 1
+
+    return {
+        "proceso": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // escala,
+        "procesos_hijos": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // escala,
+    }
+
+
+# Perfil de la ejecución actual, None si no se pidió
+_activo = None
+
+
+def activar():
+    global _activo
+    _activo = Perfil()
+    return _activo
+
+
+def activo():
+    return _activo
+
+
+def fase(nombre):
+    """
+    Contexto que suma su duración a la fase, o nada si no hay perfil activo.
+    """
+    return _activo.fase(nombre) if _activo else _SIN_PERFIL
+
+
+def sumar_fase(nombre, segundos):
+    if _activo:
+        _activo.sumar_fase(nombre, segundos)
+
+
+def sumar_hoja(ventana, segundos_extraccion):
+    """
+    Anota una hoja leída con leer_ventana: su lectura y su extracción.
+    """
+    if _activo:
+        _activo.sumar_fase("lectura de ventanas", ventana.segundos_lectura)
+        _activo.sumar_fase("extraccion", segundos_extraccion)
+        _activo.sumar_hoja(ventana.title, ventana.segundos_lectura + segundos_extraccion, ventana.cantidad_celdas())
+
+
+def mensaje(*valores):
+    if _activo:
+        _activo.mensaje(*valores)
+
+
+def guardar(ruta):
+    _activo.guardar(ruta)
+    print(f"Perfil guardado en {ruta}")
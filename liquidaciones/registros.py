@@ -0,0 +1,97 @@
+from operator import attrgetter, itemgetter
+
+# Registros que arman los extractores.
+#
+# Un libro de un año son cientos de miles de comprobantes y conceptos; con
+# __slots__ cada registro guarda sus valores en lugares fijos, sin un diccionario
+# por instancia, así que ocupan bastante menos memoria y se crean más rápido.
+# Se leen y modifican como diccionarios (registro['monto'], registro.get('monto'),
+# registro['n'] = 1), así que la exportación y la base de datos los tratan igual
+# que a los diccionarios de errores o de resumen.
+
+
+class Registro:
+    __slots__ = ()
+
+    def __init__(self, **valores):
+        for campo in self.__slots__:
+            setattr(self, campo, valores.pop(campo, None))
+
+        if valores:
+            raise TypeError(f"{type(self).__name__} no tiene los campos {', '.join(valores)}")
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+
+        setattr(self, campo, valor)
+
+    def get(self, campo, predeterminado=None):
+        return getattr(self, campo, predeterminado)
+
+    def keys(self):
+        return self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __eq__(self, otro):
+        return type(self) is type(otro) and self.__getstate__() == otro.__getstate__()
+
+    def __repr__(self):
+        valores = ", ".join(f"{campo}={getattr(self, campo)!r}" for campo in self.__slots__)
+        return f"{type(self).__name__}({valores})"
+
+    # Para pickle (caché de hojas, resultados de los procesos de --workers): solo la tupla de valores
+    def __getstate__(self):
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __setstate__(self, estado):
+        for campo, valor in zip(self.__slots__, estado):
+            setattr(self, campo, valor)
+
+
+class Liquidacion(Registro):
+    __slots__ = ('num_comprobante', 'num_comprobante_completo', 'fecha', 'razon_social', 'rif_cedula', 'pago_por',
+                 'monto', 'banco', 'cuenta', 'fecha_pago', 'referencia', 'verificado_por', 'es_cedula')
+
+
+class Concepto(Registro):
+    __slots__ = ('partida', 'descripcion', 'monto', 'num_comprobante', 'num_comprobante_completo')
+
+
+class SolvenciaInmobiliaria(Registro):
+    __slots__ = ('n', 'razon_social', 'rif_cedula', 'direccion', 'codigo_catastral', 'num_comprobante',
+                 'num_comprobante_completo', 'concepto')
+
+
+class Patente(Registro):
+    __slots__ = ('codigo', 'razon_social', 'cedula', 'placa', 'fecha', 'monto', 'referencia', 'marca', 'modelo',
+                 'año', 'color', 'uso')
+
+
+def filas(registros, campos):
+    """
+    Genera los valores de cada registro en el orden de los campos, para escribirlos como filas.
+
+    Args:
+    registros (list): Registros de un mismo tipo, o diccionarios.
+    campos (list): Los campos de cada fila.
+    """
+    if not registros:
+        return
+
+    leer = (attrgetter if isinstance(registros[0], Registro) else itemgetter)(*campos)
+
+    if len(campos) == 1:
+        for registro in registros:
+            yield [leer(registro)]
+    else:
+        for registro in registros:
+            yield list(leer(registro))
@@ -1,63 +1,83 @@
-import sys
-import openpyxl
+import os
 import re
-from datetime import datetime
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table, TableStyleInfo
+import time
+import hashlib
+import argparse
+import openpyxl
+from ventana import VentanaHoja, leer_ventana
+from fechas import extraer_fecha
+from registros import Liquidacion, Concepto, SolvenciaInmobiliaria
+from instantaneas import EXTENSION as EXTENSION_INSTANTANEA, es_instantanea, ruta_instantanea, guardar_instantanea, leer_instantanea
+from exportacion import exportar, FORMATOS_ADICIONALES
+from cache_hojas import CacheHojas, ruta_cache_para
+import perfil
+import base_datos
+from concurrent.futures import ProcessPoolExecutor
 import warnings
-from datetime import datetime, date
 
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
 isDebugging = False
 
+def depurar(*valores):
+    # Los mensajes de depuración también quedan en el perfil (--profile)
+    if isDebugging:
+        print(*valores)
+        perfil.mensaje(*valores)
+
+# Cambia con cualquier cambio de este archivo, de la lectura de fechas o de los registros, para que
+# la caché de hojas no devuelva resultados extraídos con reglas anteriores
+_huella_fuentes = hashlib.blake2b(digest_size=8)
+for _nombre_fuente in (os.path.basename(__file__), 'fechas.py', 'registros.py'):
+    _ruta_fuente = os.path.join(os.path.dirname(os.path.abspath(__file__)), _nombre_fuente)
+    with open(_ruta_fuente, 'rb') as _fuente:
+        _huella_fuentes.update(_fuente.read())
+VERSION_EXTRACCION = _huella_fuentes.hexdigest()
+
+def version_cache(tolerante):
+    # En modo tolerante las hojas con errores se guardan vacías, así que no comparten la caché con el modo normal
+    return f"{VERSION_EXTRACCION}-tolerante" if tolerante else VERSION_EXTRACCION
+
+class ErrorHoja(Exception):
+    """
+    Una hoja de comprobante que no se puede extraer: el campo que falló y el motivo.
+    """
+
+    def __init__(self, hoja, campo, motivo):
+        super().__init__(hoja, campo, motivo)
+        self.hoja = hoja
+        self.campo = campo
+        self.motivo = motivo
+
+    def __str__(self):
+        return f"hoja {self.hoja}, {self.campo}: {self.motivo}"
+
 def extraer_numero_comprobante(texto):
     return texto[-5:].replace("°", "").strip()
 
-def extraer_fecha(texto):
-    """
-    Extrae el día, mes y año de un texto en formato "25 DE ABRIL 2024" y devuelve una fecha.
-    
-    Args:
-    texto (str): La cadena de texto que contiene la fecha.
-    
-    Returns:
-    dict: Un diccionario con las claves 'dia', 'mes', 'anio' y 'fecha'.
-    """
-    # Diccionario para convertir los nombres de los meses en español a números
-    meses = {
-        "ENERO": "01", "FEBRERO": "02", "MARZO": "03", "ABRIL": "04",
-        "MAYO": "05", "JUNIO": "06", "JULIO": "07", "AGOSTO": "08",
-        "SEPTIEMBRE": "09", "OCTUBRE": "10", "NOVIEMBRE": "11", "DICIEMBRE": "12"
-    }
-    
-    # Expresión regular para extraer el día, el mes y el año
-    match = re.search(r"(\d{1,2}) DE (\w+) (\d{4})", texto, re.IGNORECASE)
-    if match:
-        dia = int(match.group(1))
-        mes_texto = match.group(2).upper()
-        anio = int(match.group(3))
-        
-        # Convertir el mes en número usando el diccionario
-        mes = int(meses.get(mes_texto, "01"))  # Valor predeterminado "01" en caso de no coincidir
-        
-        try:
-            # Crear un objeto de fecha
-            fecha = date(anio, mes, dia)
-        except ValueError:
-            fecha = None  # En caso de fecha inválida
+# "COMPROBANTE DE INGRESO N°0012345" => "0012345"
+_NUMERO_COMPLETO = re.compile(r"N[°º]\s*(\d+)", re.IGNORECASE)
 
-        # Devolver un diccionario con los valores y la fecha
-        return fecha
-    else:
-        return None
+def extraer_numero_completo(texto):
+    # El número entero del comprobante: num_comprobante son solo sus últimos 5 caracteres, que se
+    # repiten de un año a otro. Si B8 no tiene "N°", se usa todo el texto
+    coincidencia = _NUMERO_COMPLETO.search(texto)
+    return coincidencia.group(1) if coincidencia else texto.strip()
+
+# Ventana de celdas que usa cada comprobante: desde B8 (número) hasta los datos
+# del pago, que se buscan hasta la fila 39 y ocupan las 6 filas siguientes
+FILA_INICIAL_COMPROBANTE = 8
+FILA_FINAL_COMPROBANTE = 45
+
+# Columnas que lee el comprobante
+COL_A, COL_B, COL_C, COL_H = 1, 2, 3, 8
 
 def encontrar_monto(hoja):
     """
     Encuentra el valor del monto en la hoja de Excel.
     
     Args:
-    hoja (openpyxl.worksheet.worksheet.Worksheet): La hoja de Excel donde buscar el monto.
+    hoja (VentanaHoja): La ventana del comprobante donde buscar el monto.
     
     Returns:
     float or None: El valor del monto si se encuentra, de lo contrario None.
@@ -66,299 +86,666 @@ def encontrar_monto(hoja):
     
     # Iterar sobre las celdas desde A14 hasta A17
     for fila in range(14, 18):  # A14 to A17 (inclusive)
-        celda_etiqueta = hoja[f'A{fila}'].value
+        celda_etiqueta = hoja.valor(fila, COL_A)
         if celda_etiqueta and "MONTO:" in celda_etiqueta.upper():  # Normalizar a mayúsculas para comparación
             monto_fila = fila
             break  # Salir del bucle una vez que encontramos la fila
 
     # Si se encontró la fila del monto, obtener el valor en la columna B de esa fila
     if monto_fila:
-        monto_valor = hoja[f'B{monto_fila}'].value
+        monto_valor = hoja.valor(monto_fila, COL_B)
         if monto_valor == 'EXONERADO':
             return 0.0  # Tratamiento especial para el caso 'EXONERADO'
-        return float(monto_valor) if monto_valor else None
+        try:
+            return float(monto_valor) if monto_valor else None
+        except ValueError:
+            raise ErrorHoja(hoja.title, 'monto', f"B{monto_fila} no es un número: {monto_valor!r}") from None
 
     return None  # Retornar None si no se encuentra la fila con "MONTO:"
 
-def procesar_excel_y_exportar_excel(archivo_excel, archivo_salida):
-    # Cargar el archivo Excel
-    libro = openpyxl.load_workbook(archivo_excel, data_only=True)
+def extraer_hoja(hoja, avisos=None):
+    """
+    Extrae la liquidación, sus conceptos y la solvencia inmobiliaria de una hoja de comprobante.
+
+    Todas las celdas se leen de la ventana del comprobante en memoria; una hoja de
+    openpyxl se lee primero en su ventana, de una sola pasada.
+
+    Args:
+    hoja (openpyxl.worksheet.worksheet.Worksheet o VentanaHoja): La hoja del comprobante.
+    avisos (list o None): Si se indica, se le agregan los problemas que no impiden extraer la
+    hoja, como tuplas (campo, motivo).
+
+    Raises:
+    ErrorHoja: Si falta un campo sin el que no se puede extraer la hoja.
+
+    Returns:
+    tuple: (comprobante o None, lista de conceptos, solvencia o None). El número 'n' de la
+    solvencia se asigna al juntar los resultados de todas las hojas.
+    """
+    if not isinstance(hoja, VentanaHoja):
+        hoja = leer_ventana(hoja, FILA_INICIAL_COMPROBANTE, FILA_FINAL_COMPROBANTE)
+
+    valor = hoja.valor
+
+    comprobante = None
+    conceptos = []
+    solvencia = None
     
-    # Lista para almacenar las liquidaciones
-    liquidaciones = []
-    solvencias_inmobiliarias = []
+    # Extraer el número de comprobante
+    texto_comprobante = valor(8, COL_B)
+    # print(hoja.title)
+    if not isinstance(texto_comprobante, str):
+        raise ErrorHoja(hoja.title, 'num_comprobante', f"B8 no tiene el texto del comprobante: {texto_comprobante!r}")
+    num_comprobante = extraer_numero_comprobante(texto_comprobante)
+    num_comprobante_completo = extraer_numero_completo(texto_comprobante)
     
-    # Lista para almacenar los conceptos
-    conceptos = []
+    # Extraer la fecha
+    # B10 es un texto como "25 DE ABRIL 2024", o una fecha si Excel la guardó como fecha
+    celda_fecha = valor(10, COL_B)
+    with perfil.fase("extraccion: fecha"):
+        fecha = extraer_fecha(celda_fecha)
+    if fecha is None:
+        # Una fecha mal escrita no impide extraer el comprobante: queda sin fecha y se avisa
+        print(f"fecha no válida en {hoja.title}: B10 = {celda_fecha!r}")
+        if avisos is not None:
+            avisos.append(('fecha', f"B10 no tiene una fecha válida: {celda_fecha!r}"))
+    
+    # Extraer otros datos
+    razon_social = valor(12, COL_C)
+    rif_cedula = f"{valor(12, COL_H) or ''} {valor(13, COL_H) or ''}".strip()
+    es_cedula = valor(13, COL_H) != ""
+    # en caso de empezar por "PAGO POR: "
+    # pago_por = (hoja['C14'].value or '')[12:].strip()
+
+    partes_pago_por = (valor(21, COL_A) or '').split("-")
+    if len(partes_pago_por) < 2:
+        raise ErrorHoja(hoja.title, 'pago_por', f"A21 no tiene el formato \"código - descripción\": {valor(21, COL_A)!r}")
+    pago_por = partes_pago_por[1].strip()
+    
+    
+    # Identify if the settlmeent if for economic licence mantainance 
+    description = valor(14, COL_C) or ''
 
-    # Iterar sobre las hojas del libro, empezando desde la segunda
-    for hoja in libro.worksheets[1:]:
-        comprobante = {}
-        
-        # Extraer el número de comprobante
-        texto_comprobante = hoja['B8'].value
-        # print(hoja.title)
-        num_comprobante = extraer_numero_comprobante(texto_comprobante)
-        
-        # Extraer la fecha
-        texto_fecha = hoja['B10'].value
-        fecha = extraer_fecha(texto_fecha)
+    # Check if the description includes "patente", "industria", and "comercio"
+    if all(keyword in description.lower() for keyword in ["patente", "industria", "comercio"]):
+        if 'mantenimiento' in description.lower():
+            pago_por = 'MANTENIMIENTO DE PATENTE DE INDUSTRIA Y COMERCIO'
+        elif ('inscripción' in description.lower()) or ('inscripcion' in description.lower()):
+            pago_por = 'INSCRIPCION DE PATENTE DE INDUSTRIA Y COMERCIO'
+
+    monto = encontrar_monto(hoja)
+    
+    # Buscar la fila que contiene "Datos del pago" entre C32 y C36
+    datos_del_pago_primera_fila = None
+    for fila in range(20, 40):
+        valor_celda = valor(fila, COL_A)
+        if valor_celda and "DATOS DEL PAGO" in valor_celda:
+            datos_del_pago_primera_fila = fila
+            break
+
+    if not datos_del_pago_primera_fila:
+        print('value not found for: ', hoja.title)
+        if avisos is not None:
+            avisos.append(('datos_del_pago', 'no se encontró "DATOS DEL PAGO" entre A20 y A39'))
+
+    isExonerated = valor(17, COL_B) == 'EXONERADO'
+
+
+    
+    if datos_del_pago_primera_fila:
+        # Obtener los datos del pago
+        banco = valor(datos_del_pago_primera_fila + 1, COL_C) or ""
+
+        banco = banco.replace("BANCO", "").strip()
+        banco = banco.replace("DE", "").strip()
         
-        # Extraer otros datos
-        razon_social = hoja['C12'].value
-        rif_cedula = f"{hoja['H12'].value or ''} {hoja['H13'].value or ''}".strip()
-        if hoja['H13'].value != "":
-            es_cedula = True
-        # en caso de empezar por "PAGO POR: "
-        # pago_por = (hoja['C14'].value or '')[12:].strip()
-
-        pago_por = (hoja['A21'].value or '').split("-")[1].strip()
+        cuenta = valor(datos_del_pago_primera_fila + 2, COL_C) or ""
+        cuenta = cuenta.strip()
         
+        # "25/04/2024" => fecha; si no es una fecha (por ejemplo "EXONERADO") se deja el texto
+        celda_fecha_pago = valor(datos_del_pago_primera_fila + 4, COL_C)
+        with perfil.fase("extraccion: fecha"):
+            fecha_pago = extraer_fecha(celda_fecha_pago) or celda_fecha_pago
+        referencia = valor(datos_del_pago_primera_fila + 5, COL_C)
+        verificado_por = valor(datos_del_pago_primera_fila + 6, COL_C)
+
+        # Crear el registro del comprobante si se encontró el número de comprobante
+        if num_comprobante:
+
+            depurar(num_comprobante)
+
+            comprobante = Liquidacion(
+                num_comprobante=num_comprobante,
+                num_comprobante_completo=num_comprobante_completo,
+                fecha=fecha,
+                razon_social=razon_social,
+                rif_cedula=rif_cedula,
+                pago_por=pago_por,
+                monto=monto,
+                banco=banco,
+                cuenta=cuenta[len(cuenta) - 4:len(cuenta)] if len(cuenta) > 4 else cuenta,
+                fecha_pago=fecha_pago,
+                referencia=referencia,
+                verificado_por=verificado_por,
+                es_cedula=es_cedula,
+            )
+
+            if isExonerated: 
+                comprobante.banco = 'EXONERADO'
+                comprobante.cuenta = 'EXONERADO'
+                comprobante.fecha_pago = 'EXONERADO'
+                comprobante.referencia = 'EXONERADO'
         
-        # Identify if the settlmeent if for economic licence mantainance 
-        description = hoja['C14'].value or ''
 
-        # Check if the description includes "patente", "industria", and "comercio"
-        if all(keyword in description.lower() for keyword in ["patente", "industria", "comercio"]):
-            if 'mantenimiento' in description.lower():
-                pago_por = 'MANTENIMIENTO DE PATENTE DE INDUSTRIA Y COMERCIO'
-            elif ('inscripción' in description.lower()) or ('inscripcion' in description.lower()):
-                pago_por = 'INSCRIPCION DE PATENTE DE INDUSTRIA Y COMERCIO'
+            conceptos_fila_cabecera = None
+            for fila in range(18, 22):
+                valor_celda = valor(fila, COL_A)
+                if valor_celda and "CÓDIGO" in valor_celda:
+                    conceptos_fila_cabecera = fila
+                    break
 
-        monto = encontrar_monto(hoja)
-        
-        # Buscar la fila que contiene "Datos del pago" entre C32 y C36
-        datos_del_pago_primera_fila = None
-        for fila in range(20, 40):
-            valor_celda = hoja[f'A{fila}'].value
-            if valor_celda and "DATOS DEL PAGO" in valor_celda:
-                datos_del_pago_primera_fila = fila
-                break
+            depurar(comprobante)
+
+            if conceptos_fila_cabecera is None:
+                raise ErrorHoja(hoja.title, 'conceptos', 'no se encontró la cabecera "CÓDIGO" entre A18 y A21')
+
+            # Recolectar conceptos para este num_comprobante
+            for fila in range(conceptos_fila_cabecera + 1, 29):  # A21 a A28
+                partida = valor(fila, COL_A)
 
-        if not datos_del_pago_primera_fila:
-            print('value not found for: ', hoja.title)
+                depurar('partida: ', partida)
+
+                if partida and 'DATOS' in partida: break
+
+                if partida:
+                    partes_partida = partida.split("-")
+                    if len(partes_partida) < 2:
+                        raise ErrorHoja(hoja.title, 'conceptos', f"A{fila} no tiene el formato \"partida - descripción\": {partida!r}")
+
+                    monto_concepto = valor(fila, COL_H)
+                    concepto = Concepto(
+                        partida=partes_partida[0].strip(),
+                        descripcion=partes_partida[1].strip(),
+                        monto=monto_concepto,
+                        num_comprobante=num_comprobante,
+                        num_comprobante_completo=num_comprobante_completo,
+                    )
+                    conceptos.append(concepto)
+
+    
+    # scrap "impuestos sobre la propiedad inmobiliaria"
+    
+    if 'CATASTRAL' in description:
 
-        isExonerated = hoja['B17'].value == 'EXONERADO'
+        parts = []
 
+        if "UBICADA" in description: 
+            parts = description.split("UBICADA")
 
+        if "UBICADO" in description: 
+            parts = description.split("UBICADO")
         
-        if datos_del_pago_primera_fila:
-            # Obtener los datos del pago
-            banco = hoja[f'C{datos_del_pago_primera_fila + 1}'].value or ""
-
-            banco = banco.replace("BANCO", "").strip()
-            banco = banco.replace("DE", "").strip()
-            
-            cuenta = hoja[f'C{datos_del_pago_primera_fila + 2}'].value or ""
-            cuenta = cuenta.strip()
-            
-            fecha_pago = hoja[f'C{datos_del_pago_primera_fila + 4}'].value
-            referencia = hoja[f'C{datos_del_pago_primera_fila + 5}'].value
-            verificado_por = hoja[f'C{datos_del_pago_primera_fila + 6}'].value
-
-            # Crear el registro del comprobante si se encontró el número de comprobante
-            if num_comprobante:
-
-                if isDebugging:
-                    print(num_comprobante)
-
-                comprobante['num_comprobante'] = num_comprobante
-                comprobante['fecha'] = fecha
-                comprobante['razon_social'] = razon_social
-                comprobante['rif_cedula'] = rif_cedula
-                comprobante['pago_por'] = pago_por
-                comprobante['monto'] = monto
-                comprobante['banco'] = banco
-
-                if (len(cuenta) > 4):
-                    comprobante['cuenta'] = cuenta[len(cuenta) - 4:len(cuenta)]
-                else:
-                    comprobante['cuenta'] = cuenta
+        if len(parts) > 1:
+            address = parts[1].split("ASIGNADA")[0].strip()
+            parts = description.split("CATASTRAL")
+
+            if len(parts) > 1:
+                catastral_code = parts[1].split(".")[0].strip()
+                catastral_code = catastral_code.replace('Nº', '').strip()
+
+                operation = ''
+
+                if "IMPUESTO" in description and "PROPIEDAD" in description and "INMOBILIARIA" in description:
+                    operation = 'SOLVENCIA PROPIEDAD INMOBILIARIA'
+
+                if "ARRENDAMIENTO" in description and "TERRENO" in description:
+                    operation = 'ARRENDAMIENTO DE TERRENOS'
+
+                if "VENTA" in description and "TERRENO" in description:
+                    operation = 'VENTA DE TERRENOS'
+
+                if "ZONIFICACION" in description and "TERRENO" in description:
+                    operation = 'ZONIFICACION DE TERRENOS'
+
                 
-                comprobante['fecha_pago'] = fecha_pago
-                comprobante['referencia'] = referencia
-                comprobante['verificado_por'] = verificado_por
-                comprobante['es_cedula'] = es_cedula
-
-                if isExonerated: 
-                    comprobante['banco'] = 'EXONERADO'
-                    comprobante['cuenta'] = 'EXONERADO'
-                    comprobante['fecha_pago'] = 'EXONERADO'
-                    comprobante['referencia'] = 'EXONERADO'
-            
-                liquidaciones.append(comprobante)
-
-                conceptos_fila_cabecera = None
-                for fila in range(18, 22):
-                    valor_celda = hoja[f'A{fila}'].value
-                    if valor_celda and "CÓDIGO" in valor_celda:
-                        conceptos_fila_cabecera = fila
-                        break
-
-                if isDebugging: 
-                    print(comprobante)
-
-                # Recolectar conceptos para este num_comprobante
-                for fila in range(conceptos_fila_cabecera + 1, 29):  # A21 a A28
-                    partida = hoja[f'A{fila}'].value
-
-                    if isDebugging: 
-                        print('partida: ', partida)
-
-                    if partida and 'DATOS' in partida: break
-
-                    if partida:
-                        monto_concepto = hoja[f'H{fila}'].value
-                        concepto = {
-                            'partida': partida.split("-")[0].strip(),
-                            'descripcion': partida.split("-")[1].strip(),
-                            'monto': monto_concepto,
-                            'num_comprobante': num_comprobante
-                        }
-                        conceptos.append(concepto)
 
-        
-        # scrap "impuestos sobre la propiedad inmobiliaria"
-        
-        if 'CATASTRAL' in description:
+                solvencia = SolvenciaInmobiliaria(
+                    razon_social=razon_social,
+                    rif_cedula=rif_cedula,
+                    direccion=address,
+                    codigo_catastral=catastral_code,
+                    num_comprobante=num_comprobante,
+                    num_comprobante_completo=num_comprobante_completo,
+                    concepto=operation,
+                )
 
-            parts = []
+    return comprobante, conceptos, solvencia
 
-            if "UBICADA" in description: 
-                parts = description.split("UBICADA")
+def iterar_hojas(archivo_excel, streaming=False):
+    """
+    Recorre las ventanas de los comprobantes del libro, empezando desde la segunda hoja.
 
-            if "UBICADO" in description: 
-                parts = description.split("UBICADO")
-            
-            if len(parts) > 1:
-                address = parts[1].split("ASIGNADA")[0].strip()
-                parts = description.split("CATASTRAL")
+    De cada hoja solo se lee la ventana del comprobante, de una sola pasada. En modo
+    streaming el libro se abre en modo read_only, así la memoria no crece con la
+    cantidad de hojas. Una instantánea (instantaneas.py) ya tiene las ventanas de las
+    hojas del libro y no se abre con openpyxl.
+    """
+    if es_instantanea(archivo_excel):
+        with perfil.fase("carga del libro"):
+            ventanas = leer_instantanea(archivo_excel, FILA_INICIAL_COMPROBANTE, FILA_FINAL_COMPROBANTE)
 
-                if len(parts) > 1:
-                    catastral_code = parts[1].split(".")[0].strip()
-                    catastral_code = catastral_code.replace('Nº', '').strip()
+        yield from ventanas
+        return
 
-                    i = len(solvencias_inmobiliarias) + 1
+    if not streaming:
+        with perfil.fase("carga del libro"):
+            libro = openpyxl.load_workbook(archivo_excel, data_only=True)
 
-                    operation = ''
+        for hoja in libro.worksheets[1:]:
+            yield leer_ventana(hoja, FILA_INICIAL_COMPROBANTE, FILA_FINAL_COMPROBANTE)
+        return
 
-                    if "IMPUESTO" in description and "PROPIEDAD" in description and "INMOBILIARIA" in description:
-                        operation = 'SOLVENCIA PROPIEDAD INMOBILIARIA'
+    with perfil.fase("carga del libro"):
+        libro = openpyxl.load_workbook(archivo_excel, read_only=True, data_only=True)
 
-                    if "ARRENDAMIENTO" in description and "TERRENO" in description:
-                        operation = 'ARRENDAMIENTO DE TERRENOS'
+    try:
+        for hoja in libro.worksheets[1:]:
+            yield leer_ventana(hoja, FILA_INICIAL_COMPROBANTE, FILA_FINAL_COMPROBANTE)
+    finally:
+        libro.close()
 
-                    if "VENTA" in description and "TERRENO" in description:
-                        operation = 'VENTA DE TERRENOS'
+def extraer_hoja_perfilada(hoja, tolerante=False):
+    """
+    Como extraer_hoja, anotando la hoja en el perfil si hay uno activo.
 
-                    if "ZONIFICACION" in description and "TERRENO" in description:
-                        operation = 'ZONIFICACION DE TERRENOS'
+    Args:
+    hoja (VentanaHoja): La ventana de la hoja del comprobante.
+    tolerante (bool): Si una hoja no se puede extraer, devolver sus errores en lugar de detener todo.
 
-                    
+    Returns:
+    tuple: (resultado de extraer_hoja, errores). Los errores son diccionarios con 'hoja', 'campo'
+    y 'motivo'; solo se recogen en modo tolerante, donde una hoja con errores da un resultado vacío.
+    """
+    inicio = time.perf_counter()
+    avisos = [] if tolerante else None
 
-                    solvencia = {
-                        'n': i,
-                        'razon_social': razon_social,
-                        'rif_cedula': rif_cedula,
-                        'direccion': address,
-                        'codigo_catastral': catastral_code,
-                        'num_comprobante': num_comprobante,
-                        'concepto': operation,
-                    }
-                    solvencias_inmobiliarias.append(solvencia)
+    try:
+        resultado = extraer_hoja(hoja, avisos)
+    except Exception as error:
+        if not tolerante:
+            raise
 
-    # Crear un nuevo libro para las liquidaciones y conceptos
-    nuevo_libro = openpyxl.Workbook()
-    
-    # Hoja para las liquidaciones
-    nueva_hoja_liquidaciones = nuevo_libro.active
-    nueva_hoja_liquidaciones.title = "Liquidaciones"
-    
-    # Definir los nombres de las columnas para liquidaciones
-    campos_liquidaciones = ['razon_social', 'rif_cedula', 'num_comprobante', 'pago_por', 'fecha_pago', 'fecha', 'cuenta', 'banco', 'referencia', 'monto'] #, 'verificado_por', 'es_cedula']
-    
-    # Escribir la cabecera de liquidaciones
-    for col_num, campo in enumerate(campos_liquidaciones, start=1):
-        celda = nueva_hoja_liquidaciones.cell(row=1, column=col_num)
-        celda.value = campo
-    
-    # Escribir las filas de liquidaciones
-    for fila_num, liquidacion in enumerate(liquidaciones, start=2):
-        for col_num, campo in enumerate(campos_liquidaciones, start=1):
-            celda = nueva_hoja_liquidaciones.cell(row=fila_num, column=col_num)
-            celda.value = liquidacion[campo]
-    
-    # Crear una tabla para liquidaciones
-    max_fila_liquidaciones = nueva_hoja_liquidaciones.max_row
-    max_col_liquidaciones = nueva_hoja_liquidaciones.max_column
-    rango_tabla_liquidaciones = f"A1:{get_column_letter(max_col_liquidaciones)}{max_fila_liquidaciones}"
-    tabla_liquidaciones = Table(displayName="TablaLiquidaciones", ref=rango_tabla_liquidaciones)
-
-    # Estilo de la tabla para liquidaciones
-    estilo_liquidaciones = TableStyleInfo(
-        name="TableStyleMedium9", showFirstColumn=False,
-        showLastColumn=False, showRowStripes=True, showColumnStripes=True)
-    tabla_liquidaciones.tableStyleInfo = estilo_liquidaciones
-    nueva_hoja_liquidaciones.add_table(tabla_liquidaciones)
-    
-    # Hoja para los conceptos
-    nueva_hoja_conceptos = nuevo_libro.create_sheet(title="Conceptos")
-    
-    # Definir los nombres de las columnas para conceptos
-    campos_conceptos = ['partida', 'descripcion', 'monto', 'num_comprobante']
-    
-    # Escribir la cabecera de conceptos
-    for col_num, campo in enumerate(campos_conceptos, start=1):
-        celda = nueva_hoja_conceptos.cell(row=1, column=col_num)
-        celda.value = campo
-    
-    # Escribir las filas de conceptos
-    for fila_num, concepto in enumerate(conceptos, start=2):
-        for col_num, campo in enumerate(campos_conceptos, start=1):
-            celda = nueva_hoja_conceptos.cell(row=fila_num, column=col_num)
-            celda.value = concepto[campo]
-    
-    # Crear una tabla para conceptos
-    max_fila_conceptos = len(conceptos) + 1  # +1 para contar la fila de cabecera
-    max_col_conceptos = nueva_hoja_conceptos.max_column
-    rango_tabla_conceptos = f"A1:{get_column_letter(max_col_conceptos)}{max_fila_conceptos}"
-    tabla_conceptos = Table(displayName="TablaConceptos", ref=rango_tabla_conceptos)
-
-    # Estilo de la tabla para conceptos
-    estilo_conceptos = TableStyleInfo(
-        name="TableStyleMedium9", showFirstColumn=False,
-        showLastColumn=False, showRowStripes=True, showColumnStripes=True)
-    tabla_conceptos.tableStyleInfo = estilo_conceptos
-    nueva_hoja_conceptos.add_table(tabla_conceptos)
-
-
-    #### Hoja para las solvencias inmobiliarias ###########
-    nueva_hoja_solvencias_inmobiliarias = nuevo_libro.create_sheet(title="SolvenciasInmobiliarias")
-    
-    # Definir los nombres de las columnas para conceptos
-    campos_solvencias_inmobiliarias = ['n', 'razon_social', 'rif_cedula', 'codigo_catastral', 'direccion', 'num_comprobante', 'concepto']
-    
-    # Escribir la cabecera de solvencias inmobiliarias
-    for col_num, campo in enumerate(campos_solvencias_inmobiliarias, start=1):
-        celda = nueva_hoja_solvencias_inmobiliarias.cell(row=1, column=col_num)
-        celda.value = campo
-    
-    # Escribir las filas de solvencias inmobiliarias
-    for fila_num, solvencia in enumerate(solvencias_inmobiliarias, start=2):
-        for col_num, campo in enumerate(campos_solvencias_inmobiliarias, start=1):
-            celda = nueva_hoja_solvencias_inmobiliarias.cell(row=fila_num, column=col_num)
-            celda.value = solvencia[campo]
+        resultado = (None, [], None)
 
+        if isinstance(error, ErrorHoja):
+            avisos = [(error.campo, error.motivo)]
+        else:
+            avisos = [('', f"{type(error).__name__}: {error}")]
+
+    if perfil.activo():
+        perfil.sumar_hoja(hoja, time.perf_counter() - inicio)
+
+    return resultado, errores_de_hoja(hoja.title, avisos or ())
+
+def errores_de_hoja(titulo, avisos):
+    # (campo, motivo) => las filas de la hoja "Errores"
+    return [{'hoja': titulo, 'campo': campo, 'motivo': motivo} for campo, motivo in avisos]
+
+def avisos_de_errores(errores):
+    # Lo que se guarda en la caché: sin el título, porque la huella de la hoja no depende de él
+    return [(error['campo'], error['motivo']) for error in errores]
+
+def extraer_liquidaciones(archivo_excel, streaming=False):
+    """
+    Genera, hoja por hoja, el resultado de extraer_hoja para cada comprobante del libro.
+    """
+    for hoja in iterar_hojas(archivo_excel, streaming):
+        yield extraer_hoja_perfilada(hoja)[0]
+
+def extraer_hoja_con_cache(hoja, cache, tolerante=False):
+    """
+    Como extraer_hoja_perfilada, pero consultando primero la caché.
+
+    Args:
+    hoja (VentanaHoja): La ventana de la hoja del comprobante.
+    cache (CacheHojas o None): La caché de hojas ya extraídas.
+    tolerante (bool): Ver extraer_hoja_perfilada.
+
+    Returns:
+    tuple: (resultado de extraer_hoja, errores, huella). La huella es None si no hay caché o si
+    la hoja salió de la caché; si no, es la clave con la que hay que guardar el resultado y los avisos
+    (avisos_de_errores). Los errores de una hoja que sale de la caché llevan el título de esta hoja.
+    """
+    if cache is None:
+        return (*extraer_hoja_perfilada(hoja, tolerante), None)
+
+    huella = cache.huella(hoja)
+    guardado = cache.obtener(huella)
+
+    if guardado is not None:
+        perfil.sumar_fase("lectura de ventanas", hoja.segundos_lectura)
+        resultado, avisos = guardado
+        return resultado, errores_de_hoja(hoja.title, avisos), None
+
+    return (*extraer_hoja_perfilada(hoja, tolerante), huella)
+
+def error_de_libro(archivo_excel, error):
+    # Un libro que no se pudo abrir o recorrer, en modo tolerante
+    return {'hoja': os.path.basename(archivo_excel), 'campo': 'libro', 'motivo': f"{type(error).__name__}: {error}"}
+
+def extraer_libros(libros, streaming=False, cache=None, tolerante=False, carpeta_instantaneas=None):
+    """
+    Genera, en orden, (libro, *resultado de extraer_hoja_con_cache) de las hojas de todos los libros.
+    En modo tolerante, un libro que no se puede leer se anota como error y se sigue con el siguiente.
+
+    Con carpeta_instantaneas, las ventanas de cada libro leído completo se guardan además en una
+    instantánea en esa carpeta.
+    """
+    for archivo_excel in libros:
+        ventanas = [] if carpeta_instantaneas and not es_instantanea(archivo_excel) else None
+
+        try:
+            # La huella de la caché se calcula sobre la ventana del comprobante, así que se lee en modo streaming
+            for hoja in iterar_hojas(archivo_excel, streaming or cache is not None):
+                if ventanas is not None:
+                    ventanas.append(hoja)
+
+                yield (archivo_excel, *extraer_hoja_con_cache(hoja, cache, tolerante))
+        except Exception as error:
+            if not tolerante:
+                raise
+
+            yield archivo_excel, (None, [], None), [error_de_libro(archivo_excel, error)], None
+            continue
+
+        if ventanas is not None:
+            ruta = ruta_instantanea(carpeta_instantaneas, archivo_excel)
+
+            with perfil.fase("instantaneas"):
+                total_hojas = guardar_instantanea(ruta, ventanas)
+
+            print(f"Instantánea guardada: {ruta} ({total_hojas} hojas)")
+
+def listar_libros(ruta):
+    """
+    Devuelve los libros a procesar: el archivo indicado, o los .xlsx/.xlsm (y las instantáneas)
+    de una carpeta ordenados por nombre.
+    """
+    if not os.path.isdir(ruta):
+        return [ruta]
+
+    return [
+        os.path.join(ruta, nombre) for nombre in sorted(os.listdir(ruta))
+        if nombre.lower().endswith(('.xlsx', '.xlsm', EXTENSION_INSTANTANEA)) and not nombre.startswith('~$')
+    ]
+
+def _extraer_bloque(tarea):
+    """
+    Trabajo de cada proceso: extrae las hojas [inicio, fin) de un libro abierto en modo read_only.
+
+    En modo tolerante, si el libro no se puede abrir o recorrer, los resultados terminan en
+    el error del libro, como en extraer_libros.
+
+    Returns:
+    tuple: (resultados de extraer_hoja_con_cache, datos del perfil del bloque o None).
+    """
+    archivo_excel, inicio, fin, ruta_cache, perfilar, tolerante = tarea
+
+    perfil_bloque = perfil.activar() if perfilar else None
+
+    cache = CacheHojas(ruta_cache, version_cache(tolerante), solo_lectura=True) if ruta_cache else None
+
+    resultados = []
+    libro = None
+
+    try:
+        with perfil.fase("carga del libro"):
+            libro = openpyxl.load_workbook(archivo_excel, read_only=True, data_only=True)
+
+        for hoja in libro.worksheets[inicio:fin]:
+            resultados.append(extraer_hoja_con_cache(
+                leer_ventana(hoja, FILA_INICIAL_COMPROBANTE, FILA_FINAL_COMPROBANTE), cache, tolerante))
+    except Exception as error:
+        if not tolerante:
+            raise
+
+        resultados.append(((None, [], None), [error_de_libro(archivo_excel, error)], None))
+    finally:
+        if libro is not None:
+            libro.close()
+        if cache:
+            cache.cerrar()
+
+    return resultados, perfil_bloque and perfil_bloque.datos()
+
+def extraer_liquidaciones_en_paralelo(libros, workers, ruta_cache=None, tolerante=False):
+    """
+    Reparte las hojas de los libros en bloques entre varios procesos y genera, en el mismo
+    orden de las hojas, (libro, *resultado de extraer_hoja_con_cache) como extraer_libros.
+
+    Con un perfil activo, cada bloque trae el perfil de su proceso y se suma al de este,
+    así que las fases suman el tiempo de todos los procesos.
+
+    En modo tolerante, un libro que no se puede abrir se anota como error en su lugar entre los libros,
+    y uno que falla al recorrerlo, en el lugar de la hoja que falló (sus hojas siguientes no se extraen).
+    """
+    tareas = []
+    # En el orden de los libros: el error de un libro que no se pudo abrir, o None por cada tarea
+    orden = []
+    perfilar = perfil.activo() is not None
+
+    for archivo_excel in libros:
+        try:
+            with perfil.fase("carga del libro"):
+                libro = openpyxl.load_workbook(archivo_excel, read_only=True)
+                total_hojas = len(libro.sheetnames)
+                libro.close()
+        except Exception as error:
+            if not tolerante:
+                raise
+
+            orden.append((archivo_excel, (None, [], None), [error_de_libro(archivo_excel, error)], None))
+            continue
+
+        # Varios bloques por proceso para que uno lento no deje a los demás esperando
+        tamano_bloque = max(1, -(-(total_hojas - 1) // (workers * 4)))
+
+        for inicio in range(1, total_hojas, tamano_bloque):
+            tareas.append((archivo_excel, inicio, min(inicio + tamano_bloque, total_hojas), ruta_cache, perfilar, tolerante))
+            orden.append(None)
+
+    # Como en extraer_libros, después del error de un libro no se siguen sus hojas
+    libros_con_error = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        bloques = zip(tareas, executor.map(_extraer_bloque, tareas))
+
+        for error_libro in orden:
+            if error_libro is not None:
+                yield error_libro
+                continue
+
+            tarea, (resultados, datos_perfil) = next(bloques)
+
+            if datos_perfil:
+                perfil.activo().juntar(datos_perfil)
+
+            archivo_excel = tarea[0]
+
+            if archivo_excel in libros_con_error:
+                continue
+
+            for resultado in resultados:
+                yield (archivo_excel, *resultado)
+
+                if resultado[1] and resultado[1][0]['campo'] == 'libro':
+                    libros_con_error.add(archivo_excel)
+
+# Definir los nombres de las columnas de cada hoja de salida
+CAMPOS_LIQUIDACIONES = ['razon_social', 'rif_cedula', 'num_comprobante', 'pago_por', 'fecha_pago', 'fecha', 'cuenta', 'banco', 'referencia', 'monto'] #, 'verificado_por', 'es_cedula']
+CAMPOS_CONCEPTOS = ['partida', 'descripcion', 'monto', 'num_comprobante']
+CAMPOS_SOLVENCIAS_INMOBILIARIAS = ['n', 'razon_social', 'rif_cedula', 'codigo_catastral', 'direccion', 'num_comprobante', 'concepto']
+CAMPOS_ERRORES = ['hoja', 'campo', 'motivo']
+CAMPOS_LIBROS = ['libro', 'hojas', 'comprobantes', 'duplicados', 'errores']
+
+def exportar_excel(liquidaciones, conceptos, solvencias_inmobiliarias, archivo_salida, formatos=(), errores=None,
+                   libros=None):
+    hojas = [
+        ("Liquidaciones", CAMPOS_LIQUIDACIONES, liquidaciones, "TablaLiquidaciones"),
+        ("Conceptos", CAMPOS_CONCEPTOS, conceptos, "TablaConceptos"),
+        ("SolvenciasInmobiliarias", CAMPOS_SOLVENCIAS_INMOBILIARIAS, solvencias_inmobiliarias, None),
+    ]
+
+    # Solo en modo tolerante
+    if errores is not None:
+        hojas.append(("Errores", CAMPOS_ERRORES, errores, None))
+
+    # Solo al procesar una carpeta: el resumen de cada libro
+    if libros is not None:
+        hojas.append(("Libros", CAMPOS_LIBROS, libros, None))
+
+    exportar(hojas, archivo_salida, formatos)
+
+def procesar_excel_y_exportar_excel(archivo_excel, archivo_salida, streaming=False, workers=1, formatos=(), usar_cache=False,
+                                    tolerante=False, ruta_sqlite=None, carpeta_instantaneas=None):
+    # Lista para almacenar las liquidaciones
+    liquidaciones = []
+    solvencias_inmobiliarias = []
     
-    # Guardar el archivo Excel
-    nuevo_libro.save(archivo_salida)
+    # Lista para almacenar los conceptos
+    conceptos = []
+
+    # Hojas que no se pudieron extraer, solo en modo tolerante
+    errores = []
+
+    libros = listar_libros(archivo_excel)
+
+    # Con una carpeta, los comprobantes repetidos en varios libros (reexportaciones) se cuentan una
+    # sola vez: se queda el primero, en el orden de los libros y sus hojas
+    es_carpeta = os.path.isdir(archivo_excel)
+    vistos = set()
+    resumen_libros = {libro: {'libro': os.path.basename(libro), 'hojas': 0, 'comprobantes': 0, 'duplicados': 0, 'errores': 0}
+                      for libro in libros}
+
+    cache = CacheHojas(ruta_cache_para(archivo_salida), version_cache(tolerante)) if usar_cache else None
+
+    if carpeta_instantaneas:
+        os.makedirs(carpeta_instantaneas, exist_ok=True)
+
+    # Las ventanas se leen en los procesos de --workers, así que las instantáneas se guardan leyendo en
+    # este proceso; y extraer de una instantánea es rápido, no hace falta repartirla
+    if workers > 1 and (carpeta_instantaneas or any(es_instantanea(libro) for libro in libros)):
+        print("Con instantáneas los libros se procesan en un solo proceso (se ignora --workers)")
+        workers = 1
+
+    if workers > 1:
+        resultados = extraer_liquidaciones_en_paralelo(libros, workers, cache and cache.ruta, tolerante)
+    else:
+        resultados = extraer_libros(libros, streaming, cache, tolerante, carpeta_instantaneas)
+
+    hojas_en_cache = 0
+    hojas_procesadas = 0
+
+    for libro, (comprobante, conceptos_hoja, solvencia), errores_hoja, huella in resultados:
+        resumen = resumen_libros[libro]
+
+        if errores_hoja and errores_hoja[0]['campo'] == 'libro':
+            # Un libro que no se pudo leer, no es una hoja
+            errores.extend(errores_hoja)
+            resumen['errores'] += 1
+            continue
+
+        if huella:
+            cache.guardar(huella, ((comprobante, conceptos_hoja, solvencia), avisos_de_errores(errores_hoja)))
+            hojas_procesadas += 1
+        else:
+            hojas_en_cache += 1
+
+        resumen['hojas'] += 1
+        resumen['errores'] += len(errores_hoja)
+
+        num_comprobante = comprobante and comprobante.num_comprobante
+
+        if es_carpeta and num_comprobante:
+            if num_comprobante in vistos:
+                resumen['duplicados'] += 1
+                continue
+
+            vistos.add(num_comprobante)
+
+        if comprobante:
+            resumen['comprobantes'] += 1
+            liquidaciones.append(comprobante)
+
+        conceptos.extend(conceptos_hoja)
+        errores.extend(errores_hoja)
+
+        # Las solvencias se numeran al juntar los resultados, en el orden de las hojas
+        if solvencia:
+            solvencia.n = len(solvencias_inmobiliarias) + 1
+            solvencias_inmobiliarias.append(solvencia)
+
+    if cache:
+        cache.confirmar()
+        cache.cerrar()
+        print(f"Hojas en caché: {hojas_en_cache}, hojas procesadas: {hojas_procesadas}")
+
+    if tolerante:
+        print(f"Errores: {len(errores)} (hoja \"Errores\" de {archivo_salida})")
+
+    if es_carpeta:
+        for resumen in resumen_libros.values():
+            print(f"{resumen['libro']}: {resumen['hojas']} hojas, {resumen['comprobantes']} comprobantes, "
+                  f"{resumen['duplicados']} duplicados, {resumen['errores']} errores")
+
+        print(f"Total: {len(libros)} libros, {len(liquidaciones)} comprobantes, "
+              f"{sum(resumen['duplicados'] for resumen in resumen_libros.values())} duplicados descartados")
+
+    with perfil.fase("exportacion"):
+        exportar_excel(liquidaciones, conceptos, solvencias_inmobiliarias, archivo_salida, formatos,
+                       errores if tolerante else None, list(resumen_libros.values()) if es_carpeta else None)
+
+    if ruta_sqlite:
+        with perfil.fase("base de datos"):
+            base_datos.guardar_liquidaciones(ruta_sqlite, liquidaciones, conceptos, solvencias_inmobiliarias)
 
 # Ejemplo de uso
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Uso: python3 scraper.py <input_file> <output_file.xlsx>")
-        sys.exit(1)
-
-    archivo_entrada = sys.argv[1]
-    archivo_salida = sys.argv[2]
-    procesar_excel_y_exportar_excel(archivo_entrada, archivo_salida)
+    parser = argparse.ArgumentParser(description="Extrae las liquidaciones de un libro de comprobantes de ingreso.")
+    parser.add_argument("archivo_entrada",
+                        help="Libro de comprobantes (una hoja por comprobante), instantánea de un libro (--instantaneas) o carpeta con libros; con una carpeta "
+                             "los comprobantes repetidos se cuentan una vez y la salida lleva el resumen de cada libro (hoja \"Libros\")")
+    parser.add_argument("archivo_salida", help="Archivo .xlsx de salida")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Abrir el libro en modo read_only y leer una hoja a la vez")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="Cantidad de procesos para extraer las hojas en paralelo")
+    parser.add_argument("--formato", action="append", default=[], choices=FORMATOS_ADICIONALES,
+                        help="Escribir también cada hoja en este formato, al lado del .xlsx (se puede repetir)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Guardar lo extraído de cada hoja en <salida>.cache.sqlite y solo volver a extraer las hojas nuevas o modificadas")
+    parser.add_argument("--profile", metavar="ARCHIVO_JSON",
+                        help="Guardar en este archivo los tiempos de cada fase y de cada hoja, las celdas leídas y la memoria máxima")
+    parser.add_argument("--sqlite", metavar="ARCHIVO_DB",
+                        help="Agregar o actualizar también las liquidaciones, conceptos y solvencias en esta base SQLite")
+    parser.add_argument("--instantaneas", metavar="CARPETA",
+                        help=f"Guardar además las celdas leídas de cada libro en CARPETA/<libro>{EXTENSION_INSTANTANEA}; "
+                             "esa instantánea (o la carpeta) se puede pasar después como entrada para volver a extraer sin abrir el libro")
+    parser.add_argument("--tolerante", action="store_true",
+                        help="Si una hoja no se puede extraer, anotarla en la hoja \"Errores\" de la salida y seguir con las demás")
+    parser.add_argument("--depurar", action="store_true",
+                        help="Mostrar los comprobantes y partidas a medida que se extraen (isDebugging)")
+    args = parser.parse_args()
+
+    isDebugging = args.depurar
+
+    if args.profile:
+        perfil.activar()
+
+    procesar_excel_y_exportar_excel(args.archivo_entrada, args.archivo_salida,
+                                    streaming=args.streaming, workers=args.workers, formatos=args.formato,
+                                    usar_cache=args.cache, tolerante=args.tolerante,
+                                    ruta_sqlite=args.sqlite, carpeta_instantaneas=args.instantaneas)
+
+    if args.profile:
+        perfil.guardar(args.profile)
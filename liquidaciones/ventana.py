@@ -0,0 +1,92 @@
+import time
+from openpyxl.utils import column_index_from_string, coordinate_to_tuple, get_column_letter
+
+# Ventana de celdas de una hoja leída de una sola pasada.
+#
+# Las funciones de extracción leen las celdas como en una hoja de openpyxl
+# (hoja['B8'].value), así que la ventana ofrece esa misma interfaz pero sobre
+# una lista de filas en memoria. Con esto una hoja abierta en modo read_only
+# se lee una sola vez en lugar de volver a recorrer su XML en cada celda.
+
+
+class _Celda:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class VentanaHoja:
+
+    def __init__(self, title, filas, min_fila, max_fila, min_col=1, max_col=8):
+        self.title = title
+        self.filas = filas
+        self.min_fila = min_fila
+        self.max_fila = max_fila
+        self.min_col = min_col
+        self.max_col = max_col
+        # Lo que tardó leer_ventana, para el perfil
+        self.segundos_lectura = 0.0
+
+    def cantidad_celdas(self):
+        return sum(len(fila) for fila in self.filas)
+
+    def valor(self, fila, columna):
+        """
+        Devuelve el valor de la celda (fila, columna), con las columnas numeradas desde 1.
+        """
+        if not (self.min_fila <= fila <= self.max_fila and self.min_col <= columna <= self.max_col):
+            raise KeyError(f"{get_column_letter(columna)}{fila} fuera de la ventana de la hoja {self.title}")
+
+        i = fila - self.min_fila
+        j = columna - self.min_col
+
+        # openpyxl no devuelve las filas vacías del final de la hoja
+        if i >= len(self.filas) or j >= len(self.filas[i]):
+            return None
+
+        return self.filas[i][j]
+
+    def __getitem__(self, coordenada):
+        fila, columna = coordinate_to_tuple(coordenada)
+        return _Celda(self.valor(fila, columna))
+
+
+def leer_ventana(hoja, min_fila, max_fila, min_col='A', max_col='H'):
+    """
+    Lee el rango de celdas indicado de una hoja (normal o read_only) en una sola pasada.
+
+    Args:
+    hoja (openpyxl.worksheet.worksheet.Worksheet): La hoja de Excel a leer.
+    min_fila, max_fila (int): Primera y última fila de la ventana.
+    min_col, max_col (str): Primera y última columna de la ventana.
+
+    Returns:
+    VentanaHoja: Los valores de la ventana.
+    """
+    inicio = time.perf_counter()
+
+    min_col = column_index_from_string(min_col)
+    max_col = column_index_from_string(max_col)
+
+    celdas = getattr(hoja, '_cells', None)
+
+    if celdas is not None:
+        # Hoja normal: sus celdas ya están cargadas en un diccionario (fila, columna) => celda.
+        # iter_rows crearía una celda por cada posición vacía de la ventana, así que se
+        # consultan directamente
+        filas = [
+            tuple(celdas[(fila, columna)].value if (fila, columna) in celdas else None
+                  for columna in range(min_col, max_col + 1))
+            for fila in range(min_fila, max_fila + 1)
+        ]
+    else:
+        filas = list(hoja.iter_rows(
+            min_row=min_fila, max_row=max_fila,
+            min_col=min_col, max_col=max_col,
+            values_only=True))
+
+    ventana = VentanaHoja(hoja.title, filas, min_fila, max_fila, min_col, max_col)
+    ventana.segundos_lectura = time.perf_counter() - inicio
+
+    return ventana
@@ -0,0 +1,289 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import zipfile
+from scraper import extraer_liquidaciones, exportar_excel, listar_libros
+from instantaneas import es_instantanea
+from motor_patentes import extraer_patentes, CAMPOS_PATENTE
+from exportacion import exportar_libro
+
+# Vigila una carpeta y mantiene al día una salida consolidada.
+#
+# Cada libro nuevo o modificado de la carpeta se extrae (comprobantes con el
+# scraper o patentes con el motor de patentes) y se guarda su resultado en
+# memoria; después la salida se vuelve a escribir juntando los resultados de
+# todos los libros, así que solo se extraen los libros que cambiaron.
+#
+# Un libro se procesa cuando su tamaño y fecha de modificación no cambian
+# durante `espera` segundos, para no leer archivos que se están copiando.
+# Con watchdog instalado los cambios se detectan con los avisos del sistema
+# (inotify en Linux); si no, revisando la carpeta cada `intervalo` segundos.
+#
+# Si la salida no se puede escribir (por ejemplo, está abierta en Excel), se
+# conserva la anterior y se vuelve a intentar en cada revisión.
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def extraer_comprobantes(archivo_excel):
+    return list(extraer_liquidaciones(archivo_excel, streaming=True))
+
+
+def exportar_comprobantes(resultados, archivo_salida):
+    liquidaciones = []
+    conceptos = []
+    solvencias_inmobiliarias = []
+
+    for resultados_libro in resultados:
+        for comprobante, conceptos_hoja, solvencia in resultados_libro:
+            if comprobante:
+                liquidaciones.append(comprobante)
+
+            conceptos.extend(conceptos_hoja)
+
+            # Las solvencias se numeran en el orden de los libros y sus hojas
+            if solvencia:
+                solvencia.n = len(solvencias_inmobiliarias) + 1
+                solvencias_inmobiliarias.append(solvencia)
+
+    exportar_excel(liquidaciones, conceptos, solvencias_inmobiliarias, archivo_salida)
+
+    return len(liquidaciones)
+
+
+def exportar_patentes(resultados, archivo_salida):
+    patentes = [patente for resultados_libro in resultados for patente in resultados_libro]
+
+    exportar_libro([("patentes", CAMPOS_PATENTE, patentes, None)], archivo_salida)
+
+    return len(patentes)
+
+
+# tipo => (extraer un libro, exportar los resultados de todos los libros)
+EXTRACTORES = {
+    'comprobantes': (extraer_comprobantes, exportar_comprobantes),
+    'patentes': (extraer_patentes, exportar_patentes),
+}
+
+
+class _Aviso(FileSystemEventHandler):
+    """
+    Despierta al vigilante con cada cambio en la carpeta.
+    """
+
+    def __init__(self, despertar):
+        self.despertar = despertar
+
+    def on_any_event(self, evento):
+        self.despertar.set()
+
+
+class Vigilante:
+
+    def __init__(self, carpeta, archivo_salida, tipo='comprobantes', espera=5, intervalo=2):
+        """
+        Args:
+        carpeta (str): Carpeta con los libros.
+        archivo_salida (str): Archivo .xlsx consolidado.
+        tipo (str): 'comprobantes' o 'patentes'.
+        espera (float): Segundos que un libro debe quedar sin cambios antes de procesarlo.
+        intervalo (float): Segundos entre revisiones de la carpeta.
+        """
+        self.carpeta = carpeta
+        self.archivo_salida = archivo_salida
+        self.extraer, self.exportar = EXTRACTORES[tipo]
+        # Las instantáneas (scraper.py --instantaneas) solo tienen comprobantes
+        self.acepta_instantaneas = tipo == 'comprobantes'
+        self.espera = espera
+        self.intervalo = intervalo
+
+        # libro => (tamaño, fecha de modificación) con que se procesó
+        self.procesados = {}
+        # libro => resultado de extraerlo
+        self.resultados = {}
+        # libro => ((tamaño, fecha de modificación), momento en que se vio así por primera vez)
+        self.pendientes = {}
+        # La salida no refleja los resultados porque no se pudo escribir
+        self.salida_pendiente = False
+
+        self.despertar = threading.Event()
+
+    def _firma(self, libro):
+        estado = os.stat(libro)
+        return estado.st_size, estado.st_mtime_ns
+
+    def revisar(self):
+        """
+        Anota los libros nuevos o modificados y olvida los borrados.
+
+        Returns:
+        bool: True si se borró algún libro ya procesado.
+        """
+        salida = os.path.abspath(self.archivo_salida)
+        libros = set()
+
+        for libro in listar_libros(self.carpeta):
+            if os.path.abspath(libro) == salida:
+                continue
+
+            if es_instantanea(libro) and not self.acepta_instantaneas:
+                continue
+
+            try:
+                firma = self._firma(libro)
+            except FileNotFoundError:
+                continue
+
+            libros.add(libro)
+
+            if self.procesados.get(libro) == firma:
+                self.pendientes.pop(libro, None)
+                continue
+
+            anterior = self.pendientes.get(libro)
+
+            if anterior is None or anterior[0] != firma:
+                self.pendientes[libro] = (firma, time.monotonic())
+
+        for libro in list(self.pendientes):
+            if libro not in libros:
+                del self.pendientes[libro]
+
+        borrados = [libro for libro in self.procesados if libro not in libros]
+
+        for libro in borrados:
+            print(f"Libro eliminado: {libro}")
+            del self.procesados[libro]
+            self.resultados.pop(libro, None)
+
+        return bool(borrados)
+
+    def listos(self):
+        """
+        Devuelve los libros pendientes que no cambiaron durante `espera` segundos.
+        """
+        ahora = time.monotonic()
+
+        return sorted(
+            libro for libro, (_, visto) in self.pendientes.items()
+            if ahora - visto >= self.espera
+        )
+
+    def procesar(self, libros):
+        for libro in libros:
+            firma, _ = self.pendientes.pop(libro)
+
+            # Un libro a medio copiar no es un zip válido todavía; una instantánea es un gzip, y si está
+            # a medio copiar falla al extraerla y se reintenta cuando cambie
+            if not es_instantanea(libro) and not zipfile.is_zipfile(libro):
+                print(f"No es un libro de Excel válido, se reintentará cuando cambie: {libro}")
+                self.procesados[libro] = firma
+                self.resultados.pop(libro, None)
+                continue
+
+            inicio = time.time()
+
+            try:
+                self.resultados[libro] = self.extraer(libro)
+            except Exception as error:
+                print(f"Error al procesar {libro}: {error}")
+                self.resultados.pop(libro, None)
+            else:
+                print(f"Libro procesado: {libro} ({len(self.resultados[libro])} hojas, {time.time() - inicio:.2f} s)")
+
+            # Si el libro cambia durante la extracción se vuelve a procesar en la próxima revisión
+            self.procesados[libro] = firma
+
+    def actualizar_salida(self):
+        """
+        Escribe la salida con los resultados de todos los libros, en el orden de sus nombres.
+
+        Si no se puede escribir, la salida anterior queda como estaba y se reintenta en la
+        próxima revisión (salida_pendiente).
+
+        Returns:
+        bool: True si la salida se actualizó.
+        """
+        resultados = [self.resultados[libro] for libro in sorted(self.resultados)]
+
+        # Se escribe en un archivo temporal y se reemplaza, para que la salida nunca quede a medias
+        base, extension = os.path.splitext(self.archivo_salida)
+        temporal = f"{base}.tmp{extension}"
+
+        try:
+            total = self.exportar(resultados, temporal)
+            os.replace(temporal, self.archivo_salida)
+        except Exception as error:
+            print(f"No se pudo actualizar la salida {self.archivo_salida}, se reintentará: {type(error).__name__}: {error}")
+            self.salida_pendiente = True
+
+            # Si quedó el temporal, se reemplaza en el próximo intento
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+
+            return False
+
+        self.salida_pendiente = False
+        print(f"Salida actualizada: {self.archivo_salida} ({total} registros de {len(resultados)} libros)")
+
+        return True
+
+    def ejecutar(self):
+        observador = None
+
+        if Observer is not None:
+            observador = Observer()
+            observador.schedule(_Aviso(self.despertar), self.carpeta, recursive=False)
+            observador.start()
+            print(f"Vigilando {self.carpeta} (avisos del sistema)")
+        else:
+            print(f"Vigilando {self.carpeta} (revisión cada {self.intervalo} s, instale watchdog para usar los avisos del sistema)")
+
+        try:
+            while True:
+                hubo_borrados = self.revisar()
+                listos = self.listos()
+
+                if listos:
+                    self.procesar(listos)
+
+                if listos or hubo_borrados or self.salida_pendiente:
+                    self.actualizar_salida()
+
+                # Con libros pendientes hay que volver a mirarlos al cumplirse la espera
+                self.despertar.wait(self.intervalo)
+                self.despertar.clear()
+        except KeyboardInterrupt:
+            print("Vigilancia detenida")
+        finally:
+            if observador is not None:
+                observador.stop()
+                observador.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vigila una carpeta y extrae los libros nuevos o modificados a una salida consolidada.")
+    parser.add_argument("carpeta", help="Carpeta donde se dejan los libros")
+    parser.add_argument("archivo_salida", help="Archivo .xlsx consolidado")
+    parser.add_argument("--tipo", choices=sorted(EXTRACTORES), default='comprobantes',
+                        help="Extraer comprobantes de ingreso (scraper) o patentes")
+    parser.add_argument("--espera", type=float, default=5, metavar="SEGUNDOS",
+                        help="Tiempo que un libro debe quedar sin cambios antes de procesarlo")
+    parser.add_argument("--intervalo", type=float, default=2, metavar="SEGUNDOS",
+                        help="Tiempo entre revisiones de la carpeta")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.carpeta):
+        print(f"Error: {args.carpeta} no es una carpeta")
+        sys.exit(1)
+
+    Vigilante(args.carpeta, args.archivo_salida, args.tipo, args.espera, args.intervalo).ejecutar()
@@ -42,7 +42,6 @@ print the list of dictionaries
 
 
 
-from datetime import date
 import re
 import sys
 import pandas as pd
@@ -50,6 +49,73 @@ import openpyxl
 from openpyxl import load_workbook
 import os
 
+# the date parser is shared with the scrapers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "liquidaciones"))
+from fechas import extraer_fecha
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from recovery import read_sheet_cells
+
+def extract_sheet(sheet_name, cell):
+    """
+    Extract the data of one sheet, cell(coordinate) returns the value of a cell
+    """
+    # Create dictionary for this sheet
+    sheet_data = {}
+    
+    # Extract fixed cell values
+    sheet_data['razon_social'] = cell('C12')
+    
+    cell_value = cell('H12')
+    if not cell_value:
+        sheet_data['rif_cedula'] = cell('H13')
+    else:
+        sheet_data['rif_cedula'] = cell_value
+
+    cell_value = cell('B8')
+    if cell_value:
+        match = re.search(r"COMPROBANTE DE INGRESO N°(\d+)", str(cell_value), re.IGNORECASE)
+        if match:
+            sheet_data['num_comprobante'] = match.group(1)
+
+    fecha = extraer_fecha(cell('B10'))
+    if fecha:
+        sheet_data['fecha'] = fecha
+    
+    sheet_data['monto'] = cell('B17')
+    
+    # Initialize payment data fields
+    sheet_data['pago_por'] = None
+    sheet_data['fecha_pago'] = None
+    sheet_data['cuenta'] = None
+    sheet_data['banco'] = None
+    sheet_data['referencia'] = None
+    
+    # Find "DATOS DEL PAGO" in column A
+    paymentDataStartIndex = None
+    for row in range(1, 100):  # Search first 100 rows
+        cell_value = cell(f'A{row}')
+        if cell_value and "DATOS DEL PAGO" in str(cell_value).upper():
+            paymentDataStartIndex = row
+            break
+    
+    # Extract payment data if found
+    if paymentDataStartIndex:
+        try:
+            # "25/04/2024" => date, anything else (e.g. "EXONERADO") is kept as written
+            fecha_pago = cell(f'C{paymentDataStartIndex + 4}')
+            sheet_data['fecha_pago'] = extraer_fecha(fecha_pago) or fecha_pago
+            sheet_data['cuenta'] = cell(f'C{paymentDataStartIndex + 2}')
+            sheet_data['banco'] = cell(f'C{paymentDataStartIndex + 1}')
+            sheet_data['referencia'] = cell(f'C{paymentDataStartIndex + 5}')
+        except:
+            print(f"Warning: Could not extract payment data from sheet '{sheet_name}'")
+    
+    # Add sheet name for reference
+    sheet_data['sheet_name'] = sheet_name
+
+    return sheet_data
+
 def extract_data_from_excel(file_path):
     """
     Extract data from all sheets in an Excel file according to specified cell locations
@@ -63,81 +129,29 @@ def extract_data_from_excel(file_path):
     for sheet_name in wb.sheetnames:
         ws = wb[sheet_name]
         
-        # Create dictionary for this sheet
-        sheet_data = {}
-        
         try:
-            # Extract fixed cell values
-            sheet_data['razon_social'] = ws['C12'].value
-            
-            cell_value = ws['H12'].value
-            if not cell_value:
-                sheet_data['rif_cedula'] = ws['H13'].value
-            else:
-                sheet_data['rif_cedula'] = cell_value
-
-            cell_value = ws['B8'].value
-            if cell_value:
-                match = re.search(r"COMPROBANTE DE INGRESO N°(\d+)", str(cell_value), re.IGNORECASE)
-                if match:
-                    sheet_data['num_comprobante'] = match.group(1)
-
-            cell_value = ws['B10'].value
-            if cell_value:
-                match = re.search(r"(\d{1,2}) DE (\w+) (\d{4})", str(cell_value), re.IGNORECASE)
-                if match:
-                    dia = int(match.group(1))
-                    mes_nombre = match.group(2)
-                    anio = int(match.group(3))
-                    meses = {
-                        'ENERO': 1,
-                        'FEBRERO': 2,
-                        'MARZO': 3,
-                        'ABRIL': 4,
-                        'MAYO': 5,
-                        'JUNIO': 6,
-                        'JULIO': 7,
-                        'AGOSTO': 8,
-                        'SEPTIEMBRE': 9,
-                        'OCTUBRE': 10,
-                        'NOVIEMBRE': 11,
-                        'DICIEMBRE': 12
-                    }
-                    mes = meses[mes_nombre]
-                    sheet_data['fecha'] = date(anio, mes, dia)
-                    
-            sheet_data['monto'] = ws['B17'].value
-            
-            # Initialize payment data fields
-            sheet_data['pago_por'] = None
-            sheet_data['fecha_pago'] = None
-            sheet_data['cuenta'] = None
-            sheet_data['banco'] = None
-            sheet_data['referencia'] = None
-            
-            # Find "DATOS DEL PAGO" in column A
-            paymentDataStartIndex = None
-            for row in range(1, 100):  # Search first 100 rows
-                cell_value = ws[f'A{row}'].value
-                if cell_value and "DATOS DEL PAGO" in str(cell_value).upper():
-                    paymentDataStartIndex = row
-                    break
-            
-            # Extract payment data if found
-            if paymentDataStartIndex:
-                try:
-                    sheet_data['fecha_pago'] = ws[f'C{paymentDataStartIndex + 4}'].value
-                    sheet_data['cuenta'] = ws[f'C{paymentDataStartIndex + 2}'].value
-                    sheet_data['banco'] = ws[f'C{paymentDataStartIndex + 1}'].value
-                    sheet_data['referencia'] = ws[f'C{paymentDataStartIndex + 5}'].value
-                except:
-                    print(f"Warning: Could not extract payment data from sheet '{sheet_name}'")
-            
-            # Add sheet name for reference
-            sheet_data['sheet_name'] = sheet_name
-            
-            data_list.append(sheet_data)
-            
+            data_list.append(extract_sheet(sheet_name, lambda coordinate: ws[coordinate].value))
+        except Exception as e:
+            print(f"Error processing sheet '{sheet_name}': {e}")
+            continue
+    
+    return data_list
+
+def recover_data_from_excel(file_path):
+    """
+    Same as extract_data_from_excel, but reading the cells straight from the xlsx XML
+    (see recovery.py), for the workbooks load_workbook can't open
+    """
+    sheets, damaged = read_sheet_cells(file_path)
+    
+    for part in damaged:
+        print(f"Warning: damaged part {part}")
+    
+    data_list = []
+    
+    for sheet_name, cells in sheets:
+        try:
+            data_list.append(extract_sheet(sheet_name, cells.get))
         except Exception as e:
             print(f"Error processing sheet '{sheet_name}': {e}")
             continue
@@ -165,12 +179,16 @@ def save_to_excel(data_list, output_file):
     print(f"Data saved to {output_file}")
 
 def main():
-    # Get input file from command line argument
-    if len(sys.argv) < 2:
+    # Get input file from command line argument, --recover skips load_workbook
+    recover = "--recover" in sys.argv[1:]
+    arguments = [argument for argument in sys.argv[1:] if argument != "--recover"]
+    
+    if not arguments:
         print("Error: You must provide the path to your Excel file as a command line argument.")
+        print("Usage: python liquidaciones_dañado <input_file> [--recover]")
         return
     
-    input_file = sys.argv[1]
+    input_file = arguments[0]
     
     # Verify file exists
     if not os.path.exists(input_file):
@@ -179,7 +197,15 @@ def main():
     
     # Extract data
     print("Extracting data from sheets...")
-    extracted_data = extract_data_from_excel(input_file)
+    if recover:
+        extracted_data = recover_data_from_excel(input_file)
+    else:
+        try:
+            extracted_data = extract_data_from_excel(input_file)
+        except Exception as e:
+            # the workbook is too damaged for openpyxl, salvage what the XML still has
+            print(f"Could not open the workbook ({e}), switching to recovery mode...")
+            extracted_data = recover_data_from_excel(input_file)
     
     if not extracted_data:
         print("No data was extracted. Please check the file format.")
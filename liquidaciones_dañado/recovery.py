@@ -0,0 +1,408 @@
+"""
+recovery mode: reads the receipt cells straight from the xlsx XML
+
+a damaged workbook usually still has most of its zip entries, but load_workbook
+parses the whole file and gives up on the first broken part. here each
+xl/worksheets/sheetN.xml is streamed out of the zip into an incremental XML
+parser, only the cells of the columns and rows the extraction uses are kept,
+and the parse of a sheet stops as soon as it goes past the last useful row.
+the shared strings are read afterwards keeping only the ones those cells use.
+
+an entry cut in the middle (truncated file, bad CRC, broken deflate stream)
+keeps whatever was parsed before the damage. when the zip central directory
+itself is gone, the entries are found by scanning the local file headers.
+"""
+
+import re
+import struct
+import zipfile
+import zlib
+import posixpath
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+CHUNK_SIZE = 64 * 1024
+
+# the cells used by extract_sheet: B8, B10, B17, C12, H12, H13, "DATOS DEL PAGO"
+# in A1:A99 and the payment data in column C up to 5 rows below it
+COLUMNS = {"A", "B", "C", "H"}
+MAX_ROW = 104
+
+REL_WORKSHEET = "/worksheet"
+REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+CELL_REFERENCE = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _tag(element):
+    # "{namespace}row" => "row"
+    return element.tag.rsplit("}", 1)[-1]
+
+
+class ZipEntries:
+    """
+    the entries of a (possibly damaged) zip, read as a stream of chunks
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.damaged = []
+        self._names = None
+
+        try:
+            self.zip = zipfile.ZipFile(path)
+            self.local = None
+        except (zipfile.BadZipFile, OSError):
+            # no central directory, find the entries by their local headers
+            self.zip = None
+            self.local = self._scan_local_headers()
+
+    def names(self):
+        if self._names is None:
+            self._names = set(self.zip.namelist() if self.zip is not None else self.local)
+
+        return self._names
+
+    def chunks(self, name):
+        """
+        yields the uncompressed content of an entry, stopping quietly where it is damaged
+        """
+        try:
+            if self.zip is not None:
+                with self.zip.open(name) as entry:
+                    while chunk := entry.read(CHUNK_SIZE):
+                        yield chunk
+            else:
+                yield from self._local_chunks(name)
+        except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as error:
+            self.damaged.append(f"{name}: {error}")
+
+    def read(self, name):
+        return b"".join(self.chunks(name))
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+    def _scan_local_headers(self):
+        with open(self.path, "rb") as file:
+            self.data = file.read()
+
+        entries = {}
+        offset = self.data.find(LOCAL_HEADER_SIGNATURE)
+
+        while offset != -1 and offset + LOCAL_HEADER.size <= len(self.data):
+            (_, _, flags, method, _, _, _, compressed_size, _,
+             name_length, extra_length) = LOCAL_HEADER.unpack_from(self.data, offset)
+            start = offset + LOCAL_HEADER.size + name_length + extra_length
+            name = self.data[offset + LOCAL_HEADER.size:offset + LOCAL_HEADER.size + name_length]
+
+            # bit 3: the sizes come after the data, a deflate stream knows where it ends anyway
+            size = None if flags & 0x08 else compressed_size
+            entries[name.decode("utf-8", "replace")] = (start, size, method)
+
+            offset = self.data.find(LOCAL_HEADER_SIGNATURE, start + (size or 0))
+
+        return entries
+
+    def _local_chunks(self, name):
+        start, size, method = self.local[name]
+        end = len(self.data) if size is None else min(start + size, len(self.data))
+
+        if method == zipfile.ZIP_STORED:
+            for position in range(start, end, CHUNK_SIZE):
+                yield self.data[position:min(position + CHUNK_SIZE, end)]
+            return
+
+        if method != zipfile.ZIP_DEFLATED:
+            raise zipfile.BadZipFile(f"unsupported compression method {method}")
+
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+        for position in range(start, end, CHUNK_SIZE):
+            yield decompressor.decompress(self.data[position:min(position + CHUNK_SIZE, end)])
+
+            if decompressor.eof:
+                return
+
+        yield decompressor.flush()
+
+
+def _parse_stream(chunks, on_event, events=("end",)):
+    """
+    feeds the chunks into an incremental parser and calls on_event(event, element)
+    until it returns True or the XML ends
+
+    returns False if the XML breaks off before its end, keeping what was parsed
+    """
+    parser = ET.XMLPullParser(events)
+
+    for chunk in chunks:
+        try:
+            parser.feed(chunk)
+        except ET.ParseError:
+            broken = True
+        else:
+            broken = False
+
+        for event, element in parser.read_events():
+            if on_event(event, element):
+                return True
+
+        if broken:
+            return False
+
+    try:
+        parser.close()
+    except ET.ParseError:
+        return False
+
+    return True
+
+
+def _parse_small(entries, name):
+    # the small parts (workbook, relationships, styles) are parsed whole, None if missing or broken
+    if name not in entries.names():
+        return None
+
+    try:
+        return ET.fromstring(entries.read(name))
+    except ET.ParseError:
+        return None
+
+
+def worksheet_parts(entries):
+    """
+    returns [(sheet name, entry name)] in the workbook order
+
+    if the workbook or its relationships are unreadable, every
+    xl/worksheets/sheetN.xml is returned named after its file
+    """
+    workbook = _parse_small(entries, "xl/workbook.xml")
+    relationships = _parse_small(entries, "xl/_rels/workbook.xml.rels")
+
+    if workbook is not None and relationships is not None:
+        targets = {}
+
+        for relationship in relationships:
+            if relationship.get("Type", "").endswith(REL_WORKSHEET):
+                target = relationship.get("Target", "")
+                target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+                targets[relationship.get("Id")] = target
+
+        parts = [
+            (sheet.get("name"), targets[sheet.get(REL_ID)])
+            for sheet in workbook.iter() if _tag(sheet) == "sheet" and sheet.get(REL_ID) in targets
+        ]
+
+        if parts:
+            return parts
+
+    numbered = [
+        (int(match.group(1)), name) for name in entries.names()
+        if (match := re.fullmatch(r"xl/worksheets/sheet(\d+)\.xml", name))
+    ]
+
+    return [(posixpath.splitext(posixpath.basename(name))[0], name) for _, name in sorted(numbered)]
+
+
+def date_styles(entries):
+    """
+    returns the indexes of the cell styles with a date format and the workbook calendar
+    """
+    workbook = _parse_small(entries, "xl/workbook.xml")
+    epoch = CALENDAR_WINDOWS_1900
+
+    if workbook is not None:
+        for element in workbook.iter():
+            if _tag(element) == "workbookPr" and element.get("date1904") in ("1", "true"):
+                epoch = CALENDAR_MAC_1904
+
+    styles = _parse_small(entries, "xl/styles.xml")
+
+    if styles is None:
+        return set(), epoch
+
+    formats = dict(BUILTIN_FORMATS)
+    cell_formats = []
+
+    for element in styles:
+        if _tag(element) == "numFmts":
+            for number_format in element:
+                formats[int(number_format.get("numFmtId"))] = number_format.get("formatCode", "")
+        elif _tag(element) == "cellXfs":
+            cell_formats = [int(xf.get("numFmtId", 0)) for xf in element]
+
+    dates = {
+        index for index, format_id in enumerate(cell_formats)
+        if is_date_format(formats.get(format_id, ""))
+    }
+
+    return dates, epoch
+
+
+class _SheetReader:
+    """
+    keeps the raw values of the useful cells of one sheet, with the shared
+    string cells as ("s", index) until the shared strings are read
+    """
+
+    def __init__(self, dates, epoch):
+        self.dates = dates
+        self.epoch = epoch
+        self.cells = {}
+        self.row = 0
+        self.column = 0
+
+    def on_event(self, event, element):
+        tag = _tag(element)
+
+        if tag == "row":
+            if event == "start":
+                self.row = int(element.get("r") or self.row + 1)
+                self.column = 0
+
+                # the rows come in order, nothing useful is left
+                if self.row > MAX_ROW:
+                    return True
+            else:
+                element.clear()
+
+        elif tag == "c" and event == "end":
+            self.column += 1
+            reference = element.get("r")
+
+            if reference:
+                column, row = CELL_REFERENCE.match(reference).groups()
+            else:
+                column, row = _column_letter(self.column), self.row
+
+            if column in COLUMNS and int(row) <= MAX_ROW:
+                self.cells[f"{column}{row}"] = self.value(element)
+
+            element.clear()
+
+        return False
+
+    def value(self, cell):
+        kind = cell.get("t", "n")
+
+        if kind == "inlineStr":
+            return "".join(text.text or "" for text in cell.iter() if _tag(text) == "t")
+
+        raw = None
+        for child in cell:
+            if _tag(child) == "v":
+                raw = child.text
+
+        if raw is None:
+            return None
+
+        if kind == "s":
+            return ("s", int(raw))
+
+        if kind in ("str", "e"):
+            return raw
+
+        if kind == "b":
+            return raw == "1"
+
+        if kind == "d":
+            return raw
+
+        number = float(raw) if any(mark in raw for mark in ".eE") else int(raw)
+
+        if int(cell.get("s", 0)) in self.dates:
+            return from_excel(number, self.epoch)
+
+        return number
+
+
+def _column_letter(index):
+    letters = ""
+
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+
+    return letters
+
+
+def shared_strings(entries, needed):
+    """
+    returns {index: text} of the shared strings in needed
+    """
+    strings = {}
+
+    if not needed or "xl/sharedStrings.xml" not in entries.names():
+        return strings
+
+    last = max(needed)
+    index = -1
+
+    def on_event(event, element):
+        nonlocal index
+
+        if _tag(element) != "si":
+            return False
+
+        index += 1
+
+        if index in needed:
+            # the phonetic runs (rPh) are not part of the text
+            strings[index] = "".join(
+                text.text or "" for child in element if _tag(child) in ("t", "r")
+                for text in child.iter() if _tag(text) == "t"
+            )
+
+        element.clear()
+
+        return index >= last
+
+    if not _parse_stream(entries.chunks("xl/sharedStrings.xml"), on_event):
+        entries.damaged.append(f"xl/sharedStrings.xml: cut after {index + 1} strings")
+
+    return strings
+
+
+def read_sheet_cells(path):
+    """
+    returns ([(sheet name, {cell reference: value})], [damaged part descriptions])
+    """
+    entries = ZipEntries(path)
+
+    try:
+        dates, epoch = date_styles(entries)
+        sheets = []
+
+        for name, part in worksheet_parts(entries):
+            if part not in entries.names():
+                entries.damaged.append(f"{part}: missing (sheet '{name}')")
+                continue
+
+            reader = _SheetReader(dates, epoch)
+
+            if not _parse_stream(entries.chunks(part), reader.on_event, events=("start", "end")):
+                entries.damaged.append(f"{part}: cut at row {reader.row} (sheet '{name}')")
+
+            sheets.append((name, reader.cells))
+
+        needed = {
+            value[1] for _, cells in sheets for value in cells.values()
+            if isinstance(value, tuple)
+        }
+        strings = shared_strings(entries, needed)
+
+        for _, cells in sheets:
+            for reference, value in cells.items():
+                if isinstance(value, tuple):
+                    cells[reference] = strings.get(value[1])
+    finally:
+        entries.close()
+
+    return sheets, entries.damaged